@@ -1,8 +1,9 @@
 import json
 import sys
-from src.vocabularisers.trial import get_all_trials
+from src.vocabularisers.trial import get_all_sweep_trials, get_vocab_sizes
 from src.utils.results_controller import create_results_directory
 from src.stats.run_stats import run_compare_stats, run_basic_stats
+from src.stats.transition_stats import run_transition_stats
 
 
 def parse_args(path):
@@ -14,14 +15,23 @@ def parse_args(path):
 if __name__ == '__main__':
     args_path = sys.argv[1]
     data = parse_args(args_path)
-    create_results_directory(data)
+    # A config with "vocab_sizes" sweeps over all of them, training each algo once per sweep where possible
+    vocab_sizes = get_vocab_sizes(data)
+    for vocab_size in vocab_sizes:
+        create_results_directory(data, vocab_size)
 
     # 1. Train and Get All Trials
     print("--- Starting Training / Retrieving Trials ---")
-    all_trials = get_all_trials(data)
-    run_basic_stats(all_trials, data['vocab_size'])
-    run_compare_stats(all_trials, data['vocab_size'])
-
-
-
-
+    sweep_trials = get_all_sweep_trials(data, vocab_sizes)
+
+    # Stats stages whose manifests match their inputs are skipped, unless "force" is set
+    num_workers = data.get('num_workers', 1)
+    force = data.get('force', False)
+    for vocab_size in vocab_sizes:
+        all_trials = sweep_trials[vocab_size]
+        run_basic_stats(all_trials, vocab_size, num_workers, data.get('pipeline_workers', 1),
+                        data.get('weighted_stats', False), force)
+        run_compare_stats(all_trials, vocab_size, num_workers, force, data.get('bootstrap_samples', 0))
+
+    # "comparisons" lists [algo, vocab_size, algo, vocab_size] pairs, or is "all" for every pair of trials
+    run_transition_stats(sweep_trials, data.get('comparisons', []), force)
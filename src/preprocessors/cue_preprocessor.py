@@ -23,6 +23,7 @@ class CueMapping(InvertibleTextMapper):
         self.forward_map = {}
         self.backward_map = {}
 
+        # get_language_map() is read-only and shared by the whole process
         all_maps = get_language_map()
 
         unique_cues = set()
@@ -57,6 +58,29 @@ class CueMapping(InvertibleTextMapper):
     def invert(self, text: str) -> str:
         return text.translate(self.trans_backward)
 
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError("CueMapping is shared and immutable")
+        super().__setattr__(name, value)
+
+    def __reduce__(self):
+        # Unpickles to the shared mapping of the receiving process
+        return get_cue_mapping, ()
+
+
+_cue_mapping = []
+
+
+def get_cue_mapping():
+    """
+    Returns the CueMapping shared by all preprocessors and stats of this process. Its tables are built once.
+    """
+    if not _cue_mapping:
+        mapping = CueMapping()
+        mapping._frozen = True
+        _cue_mapping.append(mapping)
+    return _cue_mapping[0]
+
 
 class CueSplitter(PretokeniserSequence):
     """
@@ -79,7 +103,7 @@ class CuePreprocessor(Preprocessor):
     def __init__(self, marker: BoundaryMarker):
         super().__init__(
             uninvertible_mapping=TruncateAndNormalise(truncate_after_chars=1_000_000),
-            invertible_mapping=CueMapping(),
+            invertible_mapping=get_cue_mapping(),
             splitter=CueSplitter(marker=marker))
 
 
@@ -93,7 +117,7 @@ class CuePrefab2(Preprocessor):
     def __init__(self, marker: BoundaryMarker, truncate_text_after_chars: int = 1_000_000):
         super().__init__(
             uninvertible_mapping=TruncateAndNormalise(truncate_text_after_chars),
-            invertible_mapping=CueMapping(),  # Use CueMapping instead of RegisterASCII
+            invertible_mapping=get_cue_mapping(),  # Use CueMapping instead of RegisterASCII
             splitter=PretokeniserSequence([
                 IsolatePunctuation(HyphenMode.EXCLUDED, protect_apostrophes_without_spaces=True),
                 WhitespacePretokeniser(destructive=True),
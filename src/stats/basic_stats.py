@@ -1,10 +1,13 @@
+import io
 import matplotlib.pyplot as plt
 from src.utils.unicode import get_language_map
 from tktkt.evaluation.fertility import SegmentationProperties
 from tktkt.evaluation.entropy import TokenUnigramDistribution, RenyiEntropy
 from tktkt.evaluation.observing import FutureObserver, ObservableTokeniser, ObservableIterable
 from tktkt.util.types import NamedIterable
-from src.utils.training_data_utils import load_local_corpus_to_hf, get_corpus_word_stream
+from src.utils.training_data_utils import get_corpus_word_stream, count_corpus_words
+from src.tokenizers.segmentation_cache import tokenise, tokenise_many
+from src.stats.sharded_stats import run_sharded_stats_pipeline, run_weighted_stats_pipeline
 
 
 def tokenization_cases(tokenizers_list, word_list, l1, l2, categories):
@@ -20,13 +23,12 @@ def tokenization_cases(tokenizers_list, word_list, l1, l2, categories):
     # init cases with value 0
     num_tokens_diff = {k: [] for k in categories}
 
-    for word in word_list:
-        word_tokenization = []
-        num_tokens = []
-        for t in tokenizers_list:
-            res = t.prepareAndTokenise(word)
-            word_tokenization.append(res)
-            num_tokens.append(len(res))
+    word_list = list(word_list)
+    # Segment the whole word list per tokenizer, through the shared segmentation cache
+    all_tokenizations = [tokenise_many(t, word_list) for t in tokenizers_list]
+
+    for i, word in enumerate(word_list):
+        word_tokenization = [tokenizations[i] for tokenizations in all_tokenizations]
         # Same splits throughout all tokenizers
         if word_tokenization[0] == word_tokenization[2] and word_tokenization[1] == word_tokenization[2]:
             num_tokens_diff["same_splits"].append(word)
@@ -56,7 +58,7 @@ def plot_tokenization_cases(num_tokens_diff, algo, l1, l2, categories, word_type
     :param categories: tokenization cases
     :param word_types: False Friends words or other list of words
     :param dir: directory to save graph
-    :return:
+    :return: path of the saved graph
     """
 
     plt.figure(figsize=(15, 14))
@@ -73,6 +75,7 @@ def plot_tokenization_cases(num_tokens_diff, algo, l1, l2, categories, word_type
     plt.title(title, fontsize=18)
     plt.savefig(fig_save_path)
     plt.close()
+    return fig_save_path
     
 def get_avg_token_length_over_vocab(artifact):
     """
@@ -126,9 +129,9 @@ def write_tokenization_split(tokenizers, ff_data, l2, file_handle):
         word = ff
 
         # Base tokenizers
-        t1 = str(tokenizers[0].prepareAndTokenise(word))
-        t2 = str(tokenizers[1].prepareAndTokenise(word))
-        t3 = str(tokenizers[2].prepareAndTokenise(word))
+        t1 = str(tokenise(tokenizers[0], word))
+        t2 = str(tokenise(tokenizers[1], word))
+        t3 = str(tokenise(tokenizers[2], word))
 
         cued_l2 = "N/A"
         cued_en = "N/A"
@@ -141,12 +144,12 @@ def write_tokenization_split(tokenizers, ff_data, l2, file_handle):
             first_char = word[0]
             l2_replacement = l2_cue_map.get(first_char, first_char)
             l2_cued_word = l2_replacement + word[1:]
-            cued_l2 = str(cued_tok.prepareAndTokenise(l2_cued_word))
+            cued_l2 = str(tokenise(cued_tok, l2_cued_word))
 
             # 2. English Cues
             en_replacement = en_cue_map.get(first_char, first_char)
             en_cued_word = en_replacement + word[1:]
-            cued_en = str(cued_tok.prepareAndTokenise(en_cued_word))
+            cued_en = str(tokenise(cued_tok, en_cued_word))
 
         row = f"| {word:<15} | {t1:<40} | {t2:<40} | {t3:<40} | {cued_l2:<40} | {cued_en:<40} |"
         file_handle.write(row + "\n")
@@ -217,20 +220,26 @@ def run_stats_pipeline(tokenizer, texts, name):
     return fert_future.resolve(), entropy_future.resolve()
 
 
-def do_basic_stats(trial, vocab_size):
+def write_stats_report(stats_path, report):
+    """
+    Writes a stats report, creating the stats directory if needed
+    """
+    if not stats_path.parent.exists():
+        stats_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(stats_path, 'w', encoding='utf-8') as f:
+        f.write(report)
+
+
+def get_basic_stats_report(trial, vocab_size, pipeline_workers=1, weighted=False):
     """
-    Collects basic stats and writes them to a file in the trial's stats directory.
+    Collects basic stats and returns them as the text of 'basic_stats.txt'.
     Includes:
     1. Comparative Table of Metrics (Vocab Stats, Train Stats, Homograph Stats)
     2. Detailed Token Length Distributions (omitted from table)
     3. Tokenization Splits (False Friends)
+    With pipeline_workers > 1 the training corpus metrics are computed by the sharded pipeline. With weighted=True
+    every word type of the training corpus is tokenized once and weighted by its frequency.
     """
-    stats_dir = trial.get_stats_directory()
-    if not stats_dir.exists():
-        stats_dir.mkdir(parents=True, exist_ok=True)
-
-    stats_path = stats_dir / "basic_stats.txt"
-
     # Collect Data First
     vocab_info = trial.get_vocabularisers()
     tokenizers = trial.get_tokenizers()
@@ -286,12 +295,17 @@ def do_basic_stats(trial, vocab_size):
         full_dist_info[name] = dist
 
         # --- Advanced Eval Metrics ---
-        hf_dataset = load_local_corpus_to_hf(corpus_path)
-        training_texts = hf_dataset['text']
-
         # Training Corpus Stats - Single Pass Pipeline
-        training_words_gen = get_corpus_word_stream(hf_dataset)
-        t_fert, t_ent = run_stats_pipeline(tokenizer, training_words_gen, f"{name}_train")
+        training_words_gen = get_corpus_word_stream(corpus_path)
+        if weighted:
+            word_counts = count_corpus_words(corpus_path)
+            t_fert, t_ent = run_weighted_stats_pipeline(tokenizer, trial.algo, artifact, vocab_info[i][1],
+                                                        word_counts, pipeline_workers)
+        elif pipeline_workers > 1:
+            t_fert, t_ent = run_sharded_stats_pipeline(trial.algo, artifact, vocab_info[i][1], training_words_gen,
+                                                       pipeline_workers)
+        else:
+            t_fert, t_ent = run_stats_pipeline(tokenizer, training_words_gen, f"{name}_train")
 
         # Homograph Stats
         h_fert, _ = run_stats_pipeline(tokenizer, homographs, f"{name}_homographs")
@@ -308,8 +322,8 @@ def do_basic_stats(trial, vocab_size):
         ]
         table_rows.append(row)
 
-    # WRITE TO FILE
-    with open(stats_path, 'w', encoding='utf-8') as f:
+    # WRITE REPORT
+    with io.StringIO() as f:
         f.write(f"Basic Stats for Algo: {trial.algo}, L2: {trial.l2}, Vocab Size: {vocab_size}\n")
         f.write("=" * 50 + "\n\n")
 
@@ -358,6 +372,15 @@ def do_basic_stats(trial, vocab_size):
         ff_list = sorted(list(trial.get_ff()))
         # Use tokenizers_list directly
         write_tokenization_split(tokenizers_list, ff_list, trial.l2, f)
+        return f.getvalue()
+
+
+def do_basic_stats(trial, vocab_size, pipeline_workers=1, weighted=False):
+    """
+    Collects basic stats and writes them to 'basic_stats.txt' in the trial's stats directory.
+    """
+    report = get_basic_stats_report(trial, vocab_size, pipeline_workers, weighted)
+    write_stats_report(trial.get_stats_directory() / "basic_stats.txt", report)
 
 
 
@@ -0,0 +1,81 @@
+import numpy as np
+from src.stats.compare_stats import earth_movers_dist_batch
+
+
+def get_case_labels(num_tokens_diff, words, categories):
+    """
+    Turns tokenization cases into one category label per word
+    :param num_tokens_diff: tokenization cases --> {category: [list of words]}
+    :param words: the words, in the order of the labels
+    :param categories: categories, the label of a word is the index of its category
+    :return: int array of labels, -1 for words without a category
+    """
+    category_of = {}
+    for i, c in enumerate(categories):
+        for w in num_tokens_diff.get(c, []):
+            category_of[w] = i
+    return np.array([category_of.get(w, -1) for w in words], dtype=np.int64)
+
+
+def count_label_pairs(base_labels, sage_labels, n):
+    """
+    :return: n x n array, entry (i, j) counts the words labelled i by the base trial and j by the sage trial
+    """
+    return np.bincount(base_labels * n + sage_labels, minlength=n * n).reshape(n, n)
+
+
+def bootstrap_emd(base_labels, sage_labels, categories, l1, l2, num_samples, seed=42, chunk_size=200):
+    """
+    Paired bootstrap and permutation test of the Earth Movers Distance between the tokenization cases of two trials
+    on the same words. A bootstrap sample resamples the words with replacement. A permutation sample swaps the base
+    and sage label of every word with probability 0.5, which is the distribution of the EMD if both trials
+    tokenized the words alike.
+    The EMD of a sample only depends on how many words it has per (base label, sage label) pair, so the samples
+    are drawn as pair counts: a bootstrap sample is multinomial over the pairs, and the number of swapped words of a
+    pair is binomial. Memory is bounded by chunk_size x n^2, whatever the number of words.
+    :param base_labels: case label per word of the base trial
+    :param sage_labels: case label per word of the sage trial
+    :param categories: categories
+    :param l1: English
+    :param l2: other language
+    :param num_samples: number of bootstrap and of permutation samples
+    :param seed: random seed
+    :param chunk_size: number of samples drawn at once
+    :return: (array of bootstrap EMDs, array of permutation EMDs)
+    """
+    # Words without a category in either trial are left out
+    keep = (base_labels >= 0) & (sage_labels >= 0)
+    n = len(categories)
+    pair_counts = count_label_pairs(base_labels[keep], sage_labels[keep], n)
+    num_words = pair_counts.sum()
+    rng = np.random.default_rng(seed)
+
+    bootstrap, permutation = [], []
+    for start in range(0, num_samples, chunk_size):
+        size = min(chunk_size, num_samples - start)
+
+        samples = rng.multinomial(num_words, pair_counts.ravel() / num_words, size=size).reshape(size, n, n)
+        emds, _ = earth_movers_dist_batch(categories, l1, l2, samples.sum(axis=2), samples.sum(axis=1))
+        bootstrap.append(emds)
+
+        # Swapped words of pair (i, j) count for j in the base trial and for i in the sage trial
+        swapped = rng.binomial(pair_counts, 0.5, size=(size, n, n))
+        kept = pair_counts - swapped
+        sources = kept.sum(axis=2) + swapped.sum(axis=1)
+        targets = kept.sum(axis=1) + swapped.sum(axis=2)
+        emds, _ = earth_movers_dist_batch(categories, l1, l2, sources, targets)
+        permutation.append(emds)
+
+    return np.concatenate(bootstrap), np.concatenate(permutation)
+
+
+def get_confidence_interval(samples, confidence=0.95):
+    alpha = (1 - confidence) / 2
+    return np.quantile(samples, alpha), np.quantile(samples, 1 - alpha)
+
+
+def get_p_value(observed, null_samples):
+    """
+    :return: one-sided permutation p-value of observing an EMD at least as large as observed
+    """
+    return (1 + np.sum(null_samples >= observed)) / (1 + len(null_samples))
@@ -1,8 +1,50 @@
 import numpy as np
+from scipy import sparse
 from scipy.optimize import linprog
 
 
 
+_distance_matrices = {}
+
+def get_distance_matrix(categories, l1, l2):
+    """
+    Returns the (read-only) category distance matrix of the Earth Movers Distance, computed once per categories and
+    language pair
+    :param categories: the categories
+    :param l1: English
+    :param l2: other language
+    :return: n x n matrix
+    """
+    key = (tuple(categories), l1, l2)
+    if key not in _distance_matrices:
+        D = np.array([[dist(l1, l2, c1, c2) for c1 in categories] for c2 in categories], dtype=np.float64)
+        D.setflags(write=False)
+        _distance_matrices[key] = D
+    return _distance_matrices[key]
+
+
+_constraint_matrices = {}
+
+def get_constraint_matrix(n):
+    """
+    Returns the sparse equality constraints of an n x n transport problem, over the flattened flow matrix
+    [[ f00, f01, f02 ],
+    [ f10, f11, f12 ], ---> [f00, f01, f02, f10, f11, f12, f20, f21, f22]
+    [ f20, f21, f22 ]]
+    The first n rows are the supply constraints: row i of the flow matrix must sum to s[i]. This means we cannot
+    move more "dirt" than we have in s[i].
+    The last n rows are the demand constraints: column j must sum to t[j]. This means we want to get exactly the
+    amount of "dirt" at t[j].
+    :param n: number of categories
+    :return: 2n x n^2 sparse matrix
+    """
+    if n not in _constraint_matrices:
+        supply = sparse.kron(sparse.identity(n), np.ones((1, n)))
+        demand = sparse.kron(np.ones((1, n)), sparse.identity(n))
+        _constraint_matrices[n] = sparse.vstack([supply, demand]).tocsr()
+    return _constraint_matrices[n]
+
+
 def earth_movers_dist(categories, l1, l2, source, target, track_target=None):
     """
     Computes the Earth Movers Distance metric between to distributions. Also able to track how much earth was moved
@@ -24,32 +66,14 @@ def earth_movers_dist(categories, l1, l2, source, target, track_target=None):
 
     n = len(s)
 
-    # Create distance matrix
-    D = np.array([[dist(l1, l2, c1, c2) for c1 in categories] for c2 in categories], dtype=np.float64)
+    # Distance matrix
+    D = get_distance_matrix(categories, l1, l2)
     # we are trying to minimize c.T@x where x is the solution for the linear program. So, c is the cost
     c = D.flatten()
 
-    # Creating equality constraints
-    A_eq = []
-    b_eq = []
-
-    # Supply constraints
-    # [[ f00, f01, f02 ],
-    # [ f10, f11, f12 ], ---> [f00, f01, f02, f10, f11, f12, f20, f21, f22]
-    # [ f20, f21, f22 ]]
-    # We add the row constraints. A_eq[i][j] for all j must sum to s[i]. This means we cannot move more "dirt" than we have in s[i]
-    for i in range(n):
-        matrix = np.zeros((n, n))
-        matrix[i, :] = 1
-        A_eq.append(matrix.flatten())
-        b_eq.append(s[i])
-
-    # We add more constraints. A_eq[i][j] for all i must sum to t[j]. This means we want to get exactly the amount of "dirt" at t[j]
-    for j in range(n):
-        matrix = np.zeros((n, n))
-        matrix[:, j] = 1  # All rows in column j (incoming flows)
-        A_eq.append(matrix.flatten())
-        b_eq.append(t[j])
+    # Equality constraints: supply rows must sum to s, demand columns must sum to t
+    A_eq = get_constraint_matrix(n)
+    b_eq = np.concatenate([s, t])
 
     res = linprog(c, A_eq=A_eq, b_eq=b_eq, bounds=(0, None), method='highs')
     flow_matrix = res.x.reshape((n, n))
@@ -62,29 +86,127 @@ def earth_movers_dist(categories, l1, l2, source, target, track_target=None):
     return emd
 
 
+def earth_movers_dist_batch(categories, l1, l2, sources, targets, batch_size=256):
+    """
+    Computes the Earth Movers Distance of many source/target pairs at once. Every chunk of batch_size pairs is solved
+    as one block-diagonal linear program. The blocks are independent, so its optimum is optimal for every pair.
+    :param categories: the categories
+    :param l1: English
+    :param l2: other language
+    :param sources: k x n array of source counts or probabilities, columns in the order of categories
+    :param targets: k x n array of target counts or probabilities
+    :param batch_size: number of pairs per linear program
+    :return: (array of k distances, k x n x n array of flow matrices)
+    """
+    sources = np.asarray(sources, dtype=np.float64)
+    targets = np.asarray(targets, dtype=np.float64)
+    sources = sources / sources.sum(axis=1, keepdims=True)
+    targets = targets / targets.sum(axis=1, keepdims=True)
+
+    k, n = sources.shape
+    D = get_distance_matrix(categories, l1, l2)
+    A = get_constraint_matrix(n)
+
+    flows = np.empty((k, n, n), dtype=np.float64)
+    for start in range(0, k, batch_size):
+        end = min(start + batch_size, k)
+        m = end - start
+        c = np.tile(D.flatten(), m)
+        A_eq = sparse.kron(sparse.identity(m), A).tocsr()
+        b_eq = np.concatenate([sources[start:end], targets[start:end]], axis=1).flatten()
+        res = linprog(c, A_eq=A_eq, b_eq=b_eq, bounds=(0, None), method='highs')
+        flows[start:end] = res.x.reshape((m, n, n))
+
+    emds = np.sum(flows * D, axis=(1, 2))
+    return emds, flows
+
+
+_distance_tables = {}
+
 def dist(l1, l2, source, target):
     """
-    The distance function for Earth Movers target function
+    The distance function for Earth Movers target function. The distance table is built once per language pair
     :param l1: English
     :param l2: other language
     :param source: source category
     :param target: target category
     :return:
     """
-    d = {
-        "same_splits": {f"{l1}_t==multi_t": 1, f"{l2}_t==multi_t": 1, f"{l1}_t=={l2}_t": 1, "different_splits": 2,
-                        "same_splits": 0},
-        "different_splits": {f"{l1}_t==multi_t": 1, f"{l2}_t==multi_t": 1, f"{l1}_t=={l2}_t": 1, "same_splits": 2,
-                             "different_splits": 0},
-        f"{l1}_t==multi_t": {f"same_splits": 1, f"{l2}_t==multi_t": 0.5, f"{l1}_t=={l2}_t": 0.7, "different_splits": 1,
-                             f"{l1}_t==multi_t": 0},
-        f"{l2}_t==multi_t": {f"{l1}_t==multi_t": 0.5, f"same_splits": 1, f"{l1}_t=={l2}_t": 0.7, "different_splits": 1,
-                             f"{l2}_t==multi_t": 0},
-        f"{l1}_t=={l2}_t": {f"{l1}_t==multi_t": 0.7, f"{l2}_t==multi_t": 0.7, f"same_splits": 1, "different_splits": 1,
-                            f"{l1}_t=={l2}_t": 0}
-    }
+    if (l1, l2) not in _distance_tables:
+        _distance_tables[(l1, l2)] = {
+            "same_splits": {f"{l1}_t==multi_t": 1, f"{l2}_t==multi_t": 1, f"{l1}_t=={l2}_t": 1, "different_splits": 2,
+                            "same_splits": 0},
+            "different_splits": {f"{l1}_t==multi_t": 1, f"{l2}_t==multi_t": 1, f"{l1}_t=={l2}_t": 1, "same_splits": 2,
+                                 "different_splits": 0},
+            f"{l1}_t==multi_t": {f"same_splits": 1, f"{l2}_t==multi_t": 0.5, f"{l1}_t=={l2}_t": 0.7, "different_splits": 1,
+                                 f"{l1}_t==multi_t": 0},
+            f"{l2}_t==multi_t": {f"{l1}_t==multi_t": 0.5, f"same_splits": 1, f"{l1}_t=={l2}_t": 0.7, "different_splits": 1,
+                                 f"{l2}_t==multi_t": 0},
+            f"{l1}_t=={l2}_t": {f"{l1}_t==multi_t": 0.7, f"{l2}_t==multi_t": 0.7, f"same_splits": 1, "different_splits": 1,
+                                f"{l1}_t=={l2}_t": 0}
+        }
+
+    return _distance_tables[(l1, l2)][source][target]
+
+
+def get_word_categories(num_tokens_diff):
+    """
+    Builds the index of a tokenization case result
+    :param num_tokens_diff: tokenization cases --> {category: [list of words]}
+    :return: dictionary --> {word: category}
+    """
+    return {w: c for c, words in num_tokens_diff.items() for w in words}
+
+
+def category_transition_matrix(num_tokens_diff1, num_tokens_diff2, categories):
+    """
+    This function computes, for every pair of categories, which words are in the first category in num_tokens_diff1
+    and in the second category in num_tokens_diff2. Linear in the number of words.
+    :param num_tokens_diff1: tokenization cases 1
+    :param num_tokens_diff2: tokenization cases 2
+    :param categories: categories
+    :return: dictionary --> {from category: {to category: [list of words]}}
+    """
+    categories2 = get_word_categories(num_tokens_diff2)
+    matrix = {c1: {c2: [] for c2 in categories} for c1 in categories}
+    for c1 in categories:
+        for w in num_tokens_diff1.get(c1, []):
+            c2 = categories2.get(w)
+            if c2 in matrix[c1]:
+                matrix[c1][c2].append(w)
+    return matrix
 
-    return d[source][target]
+
+def moved_to_target(matrix, target):
+    """
+    :param matrix: category transition matrix
+    :param target: category in tokenization cases 2
+    :return: words moved to target --> {from category: [list of words]}
+    """
+    return {c: matrix[c][target] for c in matrix.keys()}
+
+
+def removed_from_target(matrix, target):
+    """
+    :param matrix: category transition matrix
+    :param target: category in tokenization cases 1
+    :return: words moved out from target --> {to category: [list of words]}
+    """
+    return {c: words for c, words in matrix[target].items() if c != target}
+
+
+def filter_moved_words(words_moved, words):
+    """
+    Keeps the moved words that are in words, in the order of words
+    :param words_moved: dictionary --> {category: [list of words]}
+    :param words: list of words to keep, e.g. the false friends
+    :return: dictionary --> {category: [list of words]}
+    """
+    filtered = {}
+    for c, moved in words_moved.items():
+        moved = set(moved)
+        filtered[c] = [w for w in words if w in moved]
+    return filtered
 
 
 def words_moved_to_target(num_tokens_diff1, num_tokens_diff2, categories, target):
@@ -96,12 +218,7 @@ def words_moved_to_target(num_tokens_diff1, num_tokens_diff2, categories, target
     :param target: which words moved to target in tokenization cases 2
     :return: words moved to target
     """
-    words_moved = {c: [] for c in categories}
-    for c, words in num_tokens_diff1.items():
-        added = set(num_tokens_diff1[c]) & set(num_tokens_diff2[target])
-        for w in added:
-            words_moved[c].append(w)
-    return words_moved
+    return moved_to_target(category_transition_matrix(num_tokens_diff1, num_tokens_diff2, categories), target)
 
 
 def words_removed_from_target(num_tokens_diff1, num_tokens_diff2, categories, target):
@@ -113,20 +230,9 @@ def words_removed_from_target(num_tokens_diff1, num_tokens_diff2, categories, ta
     :param target: which words moved out from target in tokenization cases 2
     :return: words moved out from target
     """
-    words_moved = {c: [] for c in categories if c != target}
-    for w in num_tokens_diff1[target]:
-        if w not in set(num_tokens_diff2[target]):
-            for c in words_moved.keys():
-                if w in set(num_tokens_diff2[c]):
-                    words_moved[c].append(w)
-    return words_moved
+    return removed_from_target(category_transition_matrix(num_tokens_diff1, num_tokens_diff2, categories), target)
 
 
 def words_moved_to_target_ff(num_tokens_diff1, num_tokens_diff2, ff_words, categories, target):
     words_moved = words_moved_to_target(num_tokens_diff1, num_tokens_diff2, categories, target)
-    ff_words_moved = {c: [] for c in categories}
-    for c, words in words_moved.items():
-        for ff in ff_words:
-            if ff in words:
-                ff_words_moved[c].append(ff)
-    return ff_words_moved
\ No newline at end of file
+    return filter_moved_words(words_moved, ff_words)
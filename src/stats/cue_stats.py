@@ -1,6 +1,9 @@
+import io
 from pathlib import Path
 from src.utils.unicode import get_language_map, get_inverse_language_map
-from src.preprocessors.cue_preprocessor import CueMapping
+from src.preprocessors.cue_preprocessor import get_cue_mapping
+from src.tokenizers.segmentation_cache import tokenise
+from src.stats.basic_stats import write_stats_report
 
 
 def _get_safe_cues_map(lang_code, safe_mapper):
@@ -49,8 +52,8 @@ def analyze_cue_survival(vocab, l2_lang, file_handle):
     """
     Analyzes which language cues survived in the vocabulary and their distribution across token lengths.
     """
-    # Instantiate mapper to get the actual characters used in the vocab
-    safe_mapper = CueMapping()
+    # Shared mapper to get the actual characters used in the vocab
+    safe_mapper = get_cue_mapping()
 
     l2_safe_map = _get_safe_cues_map(l2_lang, safe_mapper)
     en_safe_map = _get_safe_cues_map("en", safe_mapper)
@@ -174,8 +177,8 @@ def document_cue_mappings(l2_lang, file_handle):
     l2_cue_map = lang_map.get(l2_lang, {})
     en_cue_map = lang_map.get("en", {})
 
-    # Instantiate CueMapping to get the safe chars
-    safe_mapper = CueMapping()
+    # Shared CueMapping to get the safe chars
+    safe_mapper = get_cue_mapping()
 
     # Sort by ascii char (common keys)
     # Assumes both languages map 'a'-'z'
@@ -231,11 +234,11 @@ def analyze_false_friend_survival(ff_words, l2_lang, cued_tok, en_tok, l2_tok, f
 
         # Tokenize using the respective tokenizers
         # cued_tok handles the mapping from Unicode Cue -> Safe Latin internally
-        en_cued_toks = cued_tok.prepareAndTokenise(en_cued_word)
-        l2_cued_toks = cued_tok.prepareAndTokenise(l2_cued_word)
+        en_cued_toks = tokenise(cued_tok, en_cued_word)
+        l2_cued_toks = tokenise(cued_tok, l2_cued_word)
 
-        en_base_toks = en_tok.prepareAndTokenise(word)
-        l2_base_toks = l2_tok.prepareAndTokenise(word)
+        en_base_toks = tokenise(en_tok, word)
+        l2_base_toks = tokenise(l2_tok, word)
 
         row = f"| {word:<15} | {str(en_cued_toks):<40} | {str(en_base_toks):<40} | {str(l2_cued_toks):<40} | {str(l2_base_toks):<40} |"
         file_handle.write(row + "\n")
@@ -243,17 +246,11 @@ def analyze_false_friend_survival(ff_words, l2_lang, cued_tok, en_tok, l2_tok, f
     file_handle.write("\n")
 
 
-def do_cue_stats(trial, vocab_size):
+def get_cue_stats_report(trial, vocab_size):
     """
-    Main function to run cue-specific statistics.
-    Writes results to 'cue_stats.txt' in the trial's stats directory.
+    Runs cue-specific statistics and returns them as the text of 'cue_stats.txt'.
+    Returns None if the trial has no cued vocabulariser or tokenizer.
     """
-    stats_dir = trial.get_stats_directory()
-    if not stats_dir.exists():
-        stats_dir.mkdir(parents=True, exist_ok=True)
-
-    stats_path = stats_dir / "cue_stats.txt"
-
     # Identify Cued Vocabulariser
     # In the trial structure (list of 4 tuples), index 3 corresponds to the Cued Vocabulariser
     vocab_info = trial.get_vocabularisers()
@@ -279,7 +276,7 @@ def do_cue_stats(trial, vocab_size):
     l2_tok = tokenizers[1]
     cued_tok = tokenizers[3]
 
-    with open(stats_path, 'w', encoding='utf-8') as f:
+    with io.StringIO() as f:
         f.write(f"Cue Stats for Algo: {trial.algo}, Language: {trial.l2}\n")
         f.write("=" * 50 + "\n\n")
 
@@ -295,4 +292,15 @@ def do_cue_stats(trial, vocab_size):
 
         # 3. Mappings
         document_cue_mappings(trial.l2, f)
+        return f.getvalue()
+
+
+def do_cue_stats(trial, vocab_size):
+    """
+    Main function to run cue-specific statistics.
+    Writes results to 'cue_stats.txt' in the trial's stats directory.
+    """
+    report = get_cue_stats_report(trial, vocab_size)
+    if report is not None:
+        write_stats_report(trial.get_stats_directory() / "cue_stats.txt", report)
 
@@ -1,112 +1,213 @@
-from src.stats.basic_stats import tokenization_cases, plot_tokenization_cases, do_basic_stats
+import io
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.stats.basic_stats import tokenization_cases, plot_tokenization_cases, get_basic_stats_report, write_stats_report
 from src.vocabularisers.trial import *
-from src.stats.cue_stats import do_cue_stats
+from src.stats.cue_stats import get_cue_stats_report
+from src.utils.manifest import is_stage_current, record_stage
+from src.utils.results_controller import get_manifest_path
 from .stats_utils import get_categories
 from src.stats.compare_stats import (
         earth_movers_dist,
-        words_moved_to_target,
-        words_removed_from_target,
-        words_moved_to_target_ff
+        category_transition_matrix,
+        moved_to_target,
+        removed_from_target,
+        filter_moved_words
     )
-
-
-def run_basic_stats(all_trials, vocab_size):
-
+from src.stats.bootstrap_stats import get_case_labels, bootstrap_emd, get_confidence_interval, get_p_value
+
+# Versions of the stats reports, recorded in the stage manifests. Bump a version when the stats or the report of
+# its stage change, so the results of earlier runs are recomputed.
+BASIC_STATS_VERSION = 1
+COMPARE_STATS_VERSION = 1
+
+
+def run_in_pool(func, units, num_workers):
+    """
+    Runs func(*unit) for every unit in a process pool and yields (unit, result) pairs as they finish. Trials are
+    pickled as their training jobs only: the workers load the artifacts from the artifact store and rebuild the
+    tokenizers. The segmentation cache is per process, so segmentations made in a worker are not shared with the
+    parent or with other workers.
+    :param func: top-level function
+    :param units: list of argument tuples
+    :param num_workers: number of processes
+    """
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = {executor.submit(func, *unit): unit for unit in units}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def basic_stats_unit(trial, vocab_size, weighted=False, pipeline_workers=1):
+    """
+    Computes all basic and cue stats of one trial
+    :return: (ff tokenization cases, basic stats report, cue stats report)
+    """
+    categories = get_categories(trial)
+    tok_cases = tokenization_cases(trial.get_base_tokenizers(), trial.get_ff(), "en", trial.get_l2(), categories)
+    basic_report = get_basic_stats_report(trial, vocab_size, pipeline_workers, weighted)
+    return tok_cases, basic_report, get_cue_stats_report(trial, vocab_size)
+
+
+def run_basic_stats(all_trials, vocab_size, num_workers=1, pipeline_workers=1, weighted=False, force=False):
+    """
+    Runs the basic and cue stats of all trials. With num_workers > 1 the trials run in parallel, otherwise they run
+    one at a time and each corpus pipeline is sharded over pipeline_workers processes. With weighted=True the corpus
+    metrics tokenize each word type once, weighted by its frequency.
+    Trials whose "basic_stats" manifest matches their current inputs and outputs are skipped, unless force=True.
+    """
+    stage_inputs = {}
+    units = []
     for lang in all_trials.keys():
         for algo in all_trials[lang].keys():
             cur_trial = all_trials[lang][algo]
-            categories = get_categories(cur_trial)
-            tok_cases = tokenization_cases(cur_trial.get_base_tokenizers(), cur_trial.get_ff(), "en", cur_trial.get_l2(),categories)
-            plot_tokenization_cases(tok_cases, algo, "en", lang, categories,"ff", cur_trial.get_graph_directory())
-            #TODO: dont forget to change back
-            do_basic_stats(cur_trial, vocab_size)
-            do_cue_stats(cur_trial, vocab_size)
+            inputs = {"version": BASIC_STATS_VERSION, "trial": cur_trial.get_input_fingerprints(),
+                      "weighted": weighted}
+            if not force and is_stage_current(get_manifest_path(vocab_size, lang, algo, "basic_stats"), inputs):
+                print(f"Skipping stats for {algo} ({lang}), inputs unchanged")
+                continue
+            stage_inputs[(lang, algo)] = inputs
+            units.append((cur_trial, vocab_size, weighted, pipeline_workers if num_workers <= 1 else 1))
+
+    if num_workers <= 1:
+        results = ((unit, basic_stats_unit(*unit)) for unit in units)
+    else:
+        # Every (lang, algo) trial is independent, so they are computed in parallel and written here
+        results = run_in_pool(basic_stats_unit, units, num_workers)
+
+    for (cur_trial, _, _, _), (tok_cases, basic_report, cue_report) in results:
+        lang, algo = cur_trial.get_l2(), cur_trial.get_algo()
+        categories = get_categories(cur_trial)
+        outputs = [plot_tokenization_cases(tok_cases, algo, "en", lang, categories, "ff",
+                                           cur_trial.get_graph_directory())]
+        outputs.append(cur_trial.get_stats_directory() / "basic_stats.txt")
+        write_stats_report(outputs[-1], basic_report)
+        if cue_report is not None:
+            outputs.append(cur_trial.get_stats_directory() / "cue_stats.txt")
+            write_stats_report(outputs[-1], cue_report)
+
+        # Recorded per trial, so a crashed run resumes after the last finished trial
+        record_stage(get_manifest_path(vocab_size, lang, algo, "basic_stats"), stage_inputs[(lang, algo)], outputs)
+        print(f"Finished stats for {algo} ({lang})")
+
+
+def get_comparison_report(base_trial, sage_trial, base_name, sage_name, vocab_size, bootstrap_samples=0):
+    """
+    Compares how the tokenization cases of the homographs move between a base trial and its SAGE trial. With
+    bootstrap_samples > 0 the EMD gets a bootstrap confidence interval and a permutation p-value over the homographs
+    :return: the text of 'comparison_vs_{base_name}.txt'
+    """
+    target_category = "same_splits"  # The ideal state we want to check movement towards/from
+    lang = base_trial.get_l2()
+
+    homographs = list(base_trial.get_homographs())
+    ff_words = list(base_trial.get_ff())
+    # Ensure we have common categories (should be same for both)
+    categories = get_categories(base_trial)
 
+    # 2. Compute Distributions (Tokenization Cases) on Homographs
+    base_cases = tokenization_cases(
+        base_trial.get_base_tokenizers(), homographs, "en", lang, categories
+    )
+    sage_cases = tokenization_cases(
+        sage_trial.get_base_tokenizers(), homographs, "en", lang, categories
+    )
 
-def run_compare_stats(all_trials, vocab_size):
+    # 3. Compute Metrics
+
+    # EMD requires counts/probabilities
+    base_counts = {k: len(v) for k, v in base_cases.items()}
+    sage_counts = {k: len(v) for k, v in sage_cases.items()}
+
+    emd_val, moved_dist = earth_movers_dist(categories, "en", lang, base_counts, sage_counts,
+                                            track_target=target_category)
+
+    total_mass_in_target = sum(moved_dist.values())
+    moved_norm = {c: (moved_dist[c] / total_mass_in_target if total_mass_in_target > 0 else 0) for c in
+                  categories}
+
+    # Word Movements (Homographs), all read from one transition matrix
+    matrix = category_transition_matrix(base_cases, sage_cases, categories)
+    moved_to_same = moved_to_target(matrix, target_category)
+    removed_from_same = removed_from_target(matrix, target_category)
+
+    # Word Movements (False Friends)
+    # This checks which FF words (subset of Homographs) moved to target category
+    moved_to_same_ff = filter_moved_words(moved_to_same, ff_words)
+
+    if bootstrap_samples > 0 and homographs:
+        bootstrap, permutation = bootstrap_emd(get_case_labels(base_cases, homographs, categories),
+                                               get_case_labels(sage_cases, homographs, categories),
+                                               categories, "en", lang, bootstrap_samples)
+
+    # 4. Write Results
+    with io.StringIO() as f:
+        f.write(f"Comparison: {base_name} vs {sage_name} ({lang}) - Vocab Size: {vocab_size}\n")
+        f.write(f"Target Category: {target_category}\n")
+        f.write("=" * 40 + "\n\n")
+
+        f.write(f"Tokenization Cases (Counts on Homographs):\n")
+        f.write(f"{base_name}: {base_counts}\n")
+        f.write(f"{sage_name}: {sage_counts}\n\n")
+
+        f.write(f"Earth Mover's Distance: {emd_val:.6f}\n")
+        if bootstrap_samples > 0 and homographs:
+            low, high = get_confidence_interval(bootstrap)
+            f.write(f"Bootstrap 95% CI ({bootstrap_samples} samples): [{low:.6f}, {high:.6f}]\n")
+            f.write(f"Permutation p-value ({bootstrap_samples} samples): {get_p_value(emd_val, permutation):.6f}\n")
+        f.write(f"Total Mass Moved to Target: {total_mass_in_target:.6f}\n")
+        f.write(f"Normalized Movement to Target:\n")
+        for cat, val in moved_norm.items():
+            if val > 0:
+                f.write(f"  From {cat}: {val:.4f}\n")
+        f.write("\n")
+
+        f.write(f"Homographs Moved TO {target_category}: {sum(len(v) for v in moved_to_same.values())}\n")
+        for cat, words in moved_to_same.items():
+            if words:
+                f.write(f"  From {cat}: {len(words)} words\n")
+                # Optional: write sample words if needed
+
+        f.write(
+            f"\nHomographs Removed FROM {target_category}: {sum(len(v) for v in removed_from_same.values())}\n")
+        for cat, words in removed_from_same.items():
+            if words:
+                f.write(f"  To {cat}: {len(words)} words\n")
+
+        f.write(
+            f"\nFalse Friends Moved TO {target_category}: {sum(len(v) for v in moved_to_same_ff.values())}\n")
+        for cat, words in moved_to_same_ff.items():
+            if words:
+                f.write(f"  From {cat}: {words}\n")
+        return f.getvalue()
+
+
+def run_compare_stats(all_trials, vocab_size, num_workers=1, force=False, bootstrap_samples=0):
     pairs = [("BPE", "BPE_SAGE"), ("UNI", "UNI_SAGE")]
-    target_category = "same_splits"  # The ideal state we want to check movement towards/from
 
+    stage_inputs = {}
+    units = []
     for lang, algos in all_trials.items():
         for base_name, sage_name in pairs:
             # 1. Setup Trials & Data
-            base_trial = algos[base_name]
-            sage_trial = algos[sage_name]
-
-            homographs = list(base_trial.get_homographs())
-            ff_words = list(base_trial.get_ff())
-            # Ensure we have common categories (should be same for both)
-            categories = get_categories(base_trial)
-
-            # 2. Compute Distributions (Tokenization Cases) on Homographs
-            base_cases = tokenization_cases(
-                base_trial.get_base_tokenizers(), homographs, "en", lang, categories
-            )
-            sage_cases = tokenization_cases(
-                sage_trial.get_base_tokenizers(), homographs, "en", lang, categories
-            )
-
-            # 3. Compute Metrics
-
-            # EMD requires counts/probabilities
-            base_counts = {k: len(v) for k, v in base_cases.items()}
-            sage_counts = {k: len(v) for k, v in sage_cases.items()}
-
-            emd_val, moved_dist = earth_movers_dist(categories, "en", lang, base_counts, sage_counts,
-                                                    track_target=target_category)
-
-            total_mass_in_target = sum(moved_dist.values())
-            moved_norm = {c: (moved_dist[c] / total_mass_in_target if total_mass_in_target > 0 else 0) for c in
-                          categories}
-
-            # Word Movements (Homographs)
-            moved_to_same = words_moved_to_target(base_cases, sage_cases, categories, target_category)
-            removed_from_same = words_removed_from_target(base_cases, sage_cases, categories, target_category)
-
-            # Word Movements (False Friends)
-            # This checks which FF words (subset of Homographs) moved to target category
-            moved_to_same_ff = words_moved_to_target_ff(base_cases, sage_cases, ff_words, categories, target_category)
-
-            # 4. Write Results
-            # Save in the stats directory of the SAGE trial
-            output_path = sage_trial.get_stats_directory() / f"comparison_vs_{base_name}.txt"
-
-            # Ensure directory exists
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(f"Comparison: {base_name} vs {sage_name} ({lang}) - Vocab Size: {vocab_size}\n")
-                f.write(f"Target Category: {target_category}\n")
-                f.write("=" * 40 + "\n\n")
-
-                f.write(f"Tokenization Cases (Counts on Homographs):\n")
-                f.write(f"{base_name}: {base_counts}\n")
-                f.write(f"{sage_name}: {sage_counts}\n\n")
-
-                f.write(f"Earth Mover's Distance: {emd_val:.6f}\n")
-                f.write(f"Total Mass Moved to Target: {total_mass_in_target:.6f}\n")
-                f.write(f"Normalized Movement to Target:\n")
-                for cat, val in moved_norm.items():
-                    if val > 0:
-                        f.write(f"  From {cat}: {val:.4f}\n")
-                f.write("\n")
-
-                f.write(f"Homographs Moved TO {target_category}: {sum(len(v) for v in moved_to_same.values())}\n")
-                for cat, words in moved_to_same.items():
-                    if words:
-                        f.write(f"  From {cat}: {len(words)} words\n")
-                        # Optional: write sample words if needed
-
-                f.write(
-                    f"\nHomographs Removed FROM {target_category}: {sum(len(v) for v in removed_from_same.values())}\n")
-                for cat, words in removed_from_same.items():
-                    if words:
-                        f.write(f"  To {cat}: {len(words)} words\n")
-
-                f.write(
-                    f"\nFalse Friends Moved TO {target_category}: {sum(len(v) for v in moved_to_same_ff.values())}\n")
-                for cat, words in moved_to_same_ff.items():
-                    if words:
-                        f.write(f"  From {cat}: {words}\n")
-
-
+            base_trial, sage_trial = algos[base_name], algos[sage_name]
+            inputs = {"version": COMPARE_STATS_VERSION, "base": base_trial.get_input_fingerprints(),
+                      "sage": sage_trial.get_input_fingerprints(), "bootstrap_samples": bootstrap_samples}
+            manifest_path = get_manifest_path(vocab_size, lang, sage_name, f"compare_vs_{base_name}")
+            if not force and is_stage_current(manifest_path, inputs):
+                print(f"Skipping comparison {base_name} vs {sage_name} ({lang}), inputs unchanged")
+                continue
+            stage_inputs[(lang, sage_name)] = inputs
+            units.append((base_trial, sage_trial, base_name, sage_name, vocab_size, bootstrap_samples))
+
+    if num_workers <= 1:
+        results = ((unit, get_comparison_report(*unit)) for unit in units)
+    else:
+        results = run_in_pool(get_comparison_report, units, num_workers)
+
+    for (_, sage_trial, base_name, sage_name, _, _), report in results:
+        # Save in the stats directory of the SAGE trial
+        output_path = sage_trial.get_stats_directory() / f"comparison_vs_{base_name}.txt"
+        write_stats_report(output_path, report)
+        lang = sage_trial.get_l2()
+        record_stage(get_manifest_path(vocab_size, lang, sage_name, f"compare_vs_{base_name}"),
+                     stage_inputs[(lang, sage_name)], [output_path])
@@ -0,0 +1,171 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+from tktkt.evaluation.entropy import DEFAULT_RENYI_ALPHA, renyiEntropy
+from src.tokenizers.tokenizers import build_tokenizer
+
+
+class FertilityResult:
+    """
+    The fertility metrics of InferenceFertility that the stats reports use
+    """
+    def __init__(self, tokens_per_word_token, chars_per_word_token_token_micro):
+        self.tokens_per_word_token = tokens_per_word_token
+        self.chars_per_word_token_token_micro = chars_per_word_token_token_micro
+
+
+class EntropyResult:
+    def __init__(self, alpha, entropy):
+        self.alpha = alpha
+        self.entropy = entropy
+
+
+class PipelinePartial:
+    """
+    Mergeable counts of a tokenized word stream. Partials of disjoint shards can be merged in any order, and the
+    merged partial gives the same metrics as one pass over the whole stream.
+    """
+
+    def __init__(self):
+        self.word_count = 0
+        self.token_count = 0
+        self.char_count = 0
+        self.token_counts = Counter()
+
+    def add(self, word, tokens, count=1):
+        """
+        Adds count occurrences of a word and its tokenization. Like tktkt's SegmentationProperties, characters are
+        counted in the tokens (so including boundary markers and mapped cues), and words without tokens are skipped
+        """
+        if len(tokens) == 0:
+            return
+        self.word_count += count
+        self.token_count += len(tokens) * count
+        self.char_count += sum(map(len, tokens)) * count
+        for token in tokens:
+            self.token_counts[token] += count
+
+    def merge(self, other):
+        self.word_count += other.word_count
+        self.token_count += other.token_count
+        self.char_count += other.char_count
+        self.token_counts.update(other.token_counts)
+        return self
+
+    def get_fertility(self):
+        """
+        :return: tokens per word occurrence, and characters per token micro-averaged over word occurrences
+        """
+        tokens_per_word = self.token_count / self.word_count if self.word_count > 0 else 0.0
+        chars_per_token = self.char_count / self.token_count if self.token_count > 0 else 0.0
+        return FertilityResult(tokens_per_word, chars_per_token)
+
+    def get_entropy(self, alpha=DEFAULT_RENYI_ALPHA):
+        """
+        :return: Rényi entropy (in bits) of the token unigram distribution, computed by tktkt's renyiEntropy
+        """
+        if len(self.token_counts) == 0:
+            return EntropyResult(alpha, 0.0)
+        # Sorted, so the floating point sum does not depend on the order the shards were merged in
+        return EntropyResult(alpha, float(renyiEntropy(sorted(self.token_counts.values()), alpha=alpha)))
+
+
+_worker_tokenizer = None
+
+def _init_worker(algo, artifacts, vocabulariser):
+    """
+    Process pool initializer. Every worker builds the tokenizer once from the artifacts.
+    """
+    global _worker_tokenizer
+    _worker_tokenizer = build_tokenizer(algo, artifacts, vocabulariser)
+
+
+def _tokenise_shard(words):
+    partial = PipelinePartial()
+    for word in words:
+        partial.add(word, _worker_tokenizer.prepareAndTokenise(word))
+    return partial
+
+
+def _tokenise_weighted_shard(word_counts):
+    partial = PipelinePartial()
+    for word, count in word_counts:
+        partial.add(word, _worker_tokenizer.prepareAndTokenise(word), count)
+    return partial
+
+
+def iterate_shards(words, shard_size):
+    words = iter(words)
+    while True:
+        shard = list(islice(words, shard_size))
+        if not shard:
+            return
+        yield shard
+
+
+def merge_shard_partials(executor, func, shards, max_pending):
+    """
+    Runs func on every shard in the executor and merges the partials they return. At most max_pending shards are in
+    flight at a time, so the shards are never materialised all at once.
+    :return: merged PipelinePartial
+    """
+    merged = PipelinePartial()
+    pending = set()
+    for shard in shards:
+        if len(pending) >= max_pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                merged.merge(future.result())
+        pending.add(executor.submit(func, shard))
+
+    for future in pending:
+        merged.merge(future.result())
+    return merged
+
+
+def run_sharded_stats_pipeline(algo, artifacts, vocabulariser, words, num_workers, shard_size=100_000):
+    """
+    Sharded version of run_stats_pipeline. The word stream is split into shards that are tokenized in worker
+    processes, and the partial counts of the shards are merged into the final metrics. Only a few shards per worker
+    are in flight at a time, so the word stream is never materialised.
+    :param algo: algorithm of the tokenizer
+    :param artifacts: artifacts the tokenizer is built from
+    :param vocabulariser: vocabulariser the tokenizer is built from
+    :param words: iterable of words
+    :param num_workers: number of processes
+    :param shard_size: number of words per shard
+    :return: (FertilityResult, EntropyResult)
+    """
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker,
+                             initargs=(algo, artifacts, vocabulariser)) as executor:
+        merged = merge_shard_partials(executor, _tokenise_shard, iterate_shards(words, shard_size), 2 * num_workers)
+    return merged.get_fertility(), merged.get_entropy()
+
+
+def run_weighted_stats_pipeline(tokenizer, algo, artifacts, vocabulariser, word_counts, num_workers=1,
+                                shard_size=10_000):
+    """
+    Frequency-weighted version of run_stats_pipeline. Every word type is tokenized once and counted with its corpus
+    frequency, which gives the same metrics as tokenizing every occurrence.
+    With num_workers > 1 the word types are sharded over worker processes that rebuild the tokenizer from the
+    artifacts, with only a few shards per worker in flight at a time. Otherwise the given tokenizer is used.
+    :param tokenizer: the tokenizer, used when num_workers <= 1
+    :param algo: algorithm of the tokenizer
+    :param artifacts: artifacts the tokenizer is built from
+    :param vocabulariser: vocabulariser the tokenizer is built from
+    :param word_counts: Counter of word types --> {word: frequency}
+    :param num_workers: number of processes
+    :param shard_size: number of word types per shard
+    :return: (FertilityResult, EntropyResult)
+    """
+    if num_workers <= 1:
+        merged = PipelinePartial()
+        for word, count in word_counts.items():
+            merged.add(word, tokenizer.prepareAndTokenise(word), count)
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker,
+                                 initargs=(algo, artifacts, vocabulariser)) as executor:
+            merged = merge_shard_partials(executor, _tokenise_weighted_shard,
+                                          iterate_shards(word_counts.items(), shard_size), 2 * num_workers)
+
+    return merged.get_fertility(), merged.get_entropy()
@@ -0,0 +1,130 @@
+import csv
+import io
+from itertools import permutations
+from src.stats.basic_stats import tokenization_cases, write_stats_report
+from src.stats.compare_stats import category_transition_matrix
+from src.stats.stats_utils import get_categories
+from src.utils.manifest import is_stage_current, record_stage
+from src.utils.results_controller import get_comparison_directory
+
+# Recorded in the stage manifests, bump it when the transition counts or their reports change
+TRANSITION_STATS_VERSION = 1
+
+
+def get_comparison_words(trial):
+    """
+    :return: the homographs followed by the false friends that are not homographs, each word once
+    """
+    words = list(dict.fromkeys(trial.get_homographs()))
+    words.extend(w for w in sorted(trial.get_ff()) if w not in trial.get_homographs())
+    return words
+
+
+def get_trial_cases(trial, words):
+    """
+    Tokenization cases of the words, keyed by the position of their category
+    :return: dictionary --> {category index: [list of words]}
+    """
+    categories = get_categories(trial)
+    cases = tokenization_cases(trial.get_base_tokenizers(), words, "en", trial.get_l2(), categories)
+    return {i: cases[c] for i, c in enumerate(categories)}
+
+
+def get_transition_counts(cases_a, cases_b, word_types):
+    """
+    Counts the full category transition matrix from one trial to another, per word type
+    :param cases_a: tokenization cases of trial a, keyed by category index
+    :param cases_b: tokenization cases of trial b, keyed by category index
+    :param word_types: dictionary --> {word type: set of words}
+    :return: dictionary --> {word type: n x n list of counts}
+    """
+    n = len(cases_a)
+    matrix = category_transition_matrix(cases_a, cases_b, list(range(n)))
+    counts = {}
+    for word_type, words in word_types.items():
+        counts[word_type] = [[sum(1 for w in matrix[i][j] if w in words) for j in range(n)] for i in range(n)]
+    return counts
+
+
+def write_transition_csv(path, counts, categories):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["word_type", "from_category", "to_category", "count"])
+        for word_type, matrix in counts.items():
+            for i, row in enumerate(matrix):
+                for j, count in enumerate(row):
+                    writer.writerow([word_type, categories[i], categories[j], count])
+
+
+def get_transition_report(name_a, name_b, counts, categories):
+    """
+    :return: the text report of a transition matrix, rows are the categories of a, columns the categories of b
+    """
+    width = max(len(c) for c in categories) + 2
+    with io.StringIO() as f:
+        f.write(f"Category transitions: {name_a} -> {name_b}\n")
+        f.write("=" * 40 + "\n")
+        for word_type, matrix in counts.items():
+            f.write(f"\n{word_type} ({sum(map(sum, matrix))} words):\n")
+            f.write(" " * width + "".join(c.rjust(width) for c in categories) + "\n")
+            for c, row in zip(categories, matrix):
+                f.write(c.ljust(width) + "".join(str(count).rjust(width) for count in row) + "\n")
+        return f.getvalue()
+
+
+def get_comparison_pairs(sweep_trials, comparisons):
+    """
+    :param sweep_trials: dictionary --> {vocab size: {language: {algo: Trial}}}
+    :param comparisons: list of [algo a, vocab size a, algo b, vocab size b], or "all" for every ordered pair of
+     trials of the same language
+    :return: list of ((algo a, vocab size a), (algo b, vocab size b))
+    """
+    if comparisons == "all":
+        trial_ids = [(algo, vocab_size) for vocab_size, langs in sweep_trials.items()
+                     for algo in next(iter(langs.values())).keys()]
+        return list(permutations(trial_ids, 2))
+    return [((algo_a, vocab_size_a), (algo_b, vocab_size_b))
+            for algo_a, vocab_size_a, algo_b, vocab_size_b in comparisons]
+
+
+def run_transition_stats(sweep_trials, comparisons, force=False):
+    """
+    Writes the category transition matrix of homographs and false friends between pairs of trials of the same
+    language, which may differ in algo and in vocab size. The tokenization cases of every trial are computed once,
+    so each pair only costs a pass over the words.
+    :param sweep_trials: dictionary --> {vocab size: {language: {algo: Trial}}}
+    :param comparisons: see get_comparison_pairs
+    :param force: recompute comparisons whose manifests are current
+    """
+    pairs = get_comparison_pairs(sweep_trials, comparisons)
+    if not pairs:
+        return
+    langs = next(iter(sweep_trials.values())).keys()
+    for lang in langs:
+        trial_cases = {}
+        for (algo_a, vocab_size_a), (algo_b, vocab_size_b) in pairs:
+            trial_a, trial_b = sweep_trials[vocab_size_a][lang][algo_a], sweep_trials[vocab_size_b][lang][algo_b]
+            name_a, name_b = f"{algo_a}_{vocab_size_a}", f"{algo_b}_{vocab_size_b}"
+            output_dir = get_comparison_directory(lang)
+            manifest_path = output_dir / "manifests" / f"{name_a}_vs_{name_b}.json"
+            inputs = {"version": TRANSITION_STATS_VERSION, "a": trial_a.get_input_fingerprints(),
+                      "b": trial_b.get_input_fingerprints()}
+            if not force and is_stage_current(manifest_path, inputs):
+                print(f"Skipping transitions {name_a} -> {name_b} ({lang}), inputs unchanged")
+                continue
+
+            # Both trials have the same language, so they share their homographs and false friends
+            words = get_comparison_words(trial_a)
+            for trial_id, trial in (((algo_a, vocab_size_a), trial_a), ((algo_b, vocab_size_b), trial_b)):
+                if trial_id not in trial_cases:
+                    trial_cases[trial_id] = get_trial_cases(trial, words)
+            word_types = {"homographs": trial_a.get_homographs(), "ff": trial_a.get_ff()}
+            counts = get_transition_counts(trial_cases[(algo_a, vocab_size_a)],
+                                           trial_cases[(algo_b, vocab_size_b)], word_types)
+
+            categories = get_categories(trial_a)
+            outputs = [output_dir / f"{name_a}_vs_{name_b}.csv", output_dir / f"{name_a}_vs_{name_b}.txt"]
+            write_transition_csv(outputs[0], counts, categories)
+            write_stats_report(outputs[1], get_transition_report(name_a, name_b, counts, categories))
+            record_stage(manifest_path, inputs, outputs)
@@ -0,0 +1,71 @@
+import weakref
+from collections import OrderedDict
+
+
+class SegmentationCache:
+    """
+    Cache of word segmentations, so every (tokenizer, word) pair is segmented once per process.
+    Worker processes rebuild their own tokenizers and start with an empty cache, nothing is shared between processes.
+    Tokenizers are identified by the artifacts they were built from (see register), so tokenizers rebuilt from the
+    same artifacts share their segmentations. The cache keeps a reference to those artifacts, not to the tokenizers,
+    so an identity can never be reused while its segmentations are cached. Only the segmentations of the
+    max_tokenizers most recently used identities are kept.
+    """
+
+    def __init__(self, max_tokenizers=32):
+        self.max_tokenizers = max_tokenizers
+        self.owners = weakref.WeakKeyDictionary()
+        self.segmentations = OrderedDict()
+
+    def register(self, tokenizer, artifacts):
+        """
+        Identifies a tokenizer by the artifacts it was built from. Unregistered tokenizers are their own identity.
+        """
+        self.owners[tokenizer] = artifacts
+
+    def _get_segmentations(self, tokenizer):
+        owner = self.owners.get(tokenizer, tokenizer)
+        owner_id = id(owner)
+        if owner_id in self.segmentations:
+            self.segmentations.move_to_end(owner_id)
+        else:
+            self.segmentations[owner_id] = (owner, {})
+            while len(self.segmentations) > self.max_tokenizers:
+                self.segmentations.popitem(last=False)
+        return self.segmentations[owner_id][1]
+
+    def tokenise(self, tokenizer, word):
+        """
+        :param tokenizer: the tokenizer
+        :param word: the word to segment
+        :return: list of tokens, as returned by tokenizer.prepareAndTokenise
+        """
+        return self.tokenise_many(tokenizer, [word])[0]
+
+    def tokenise_many(self, tokenizer, words):
+        """
+        Segments a batch of words, only calling the tokenizer on words it has not segmented before
+        :param tokenizer: the tokenizer
+        :param words: iterable of words
+        :return: list of token lists, in the order of words
+        """
+        segmentations = self._get_segmentations(tokenizer)
+        words = list(words)
+        for word in words:
+            if word not in segmentations:
+                segmentations[word] = tokenizer.prepareAndTokenise(word)
+        return [segmentations[word] for word in words]
+
+    def clear(self):
+        self.segmentations.clear()
+
+
+segmentation_cache = SegmentationCache()
+
+
+def tokenise(tokenizer, word):
+    return segmentation_cache.tokenise(tokenizer, word)
+
+
+def tokenise_many(tokenizer, words):
+    return segmentation_cache.tokenise_many(tokenizer, words)
@@ -3,6 +3,7 @@ from tktkt.models.huggingface.bpe import HuggingFaceBPETokeniser
 from tktkt.models.kudopiece.segmentation import KudoPieceTokeniser
 from tktkt.interfaces.tokenisers import TokeniserWithVocabulary, WithSpecials
 from tktkt.models.sage.vocabularisation import SageVocabulariser
+from src.tokenizers.segmentation_cache import segmentation_cache
 
 
 class FixedSageTokeniser(SageTokeniser):
@@ -52,28 +53,42 @@ class FixedSageTokeniser(SageTokeniser):
         from sage_tokenizer.model import SaGeTokenizer
         self.backend = SaGeTokenizer(initial_vocabulary=init_vocab_hex)
 
+def build_tokenizer(algo, artifacts, vocabulariser):
+    """
+    Builds the tokenizer of a trained vocabulariser from its artifacts. Tokenizers built from the same artifacts
+    share their entries in the segmentation cache
+    :param algo: algorithm name
+    :param artifacts: the trained artifacts
+    :param vocabulariser: the vocabulariser, for its preprocessor
+    :return: tokenizer
+    """
+    if "SAGE" in algo:
+        tokenizer = FixedSageTokeniser(
+            preprocessor=vocabulariser.preprocessor,
+            vocab=artifacts.getVocabulary()
+        )
+    elif "BPE" in algo:
+        tokenizer = HuggingFaceBPETokeniser(
+            preprocessor=vocabulariser.preprocessor,
+            vocab=artifacts.getVocabulary(),
+            merges=artifacts.getMerges())
+    else: # KUDO
+        tokenizer = KudoPieceTokeniser(
+            preprocessor=vocabulariser.preprocessor,
+            model_file=artifacts.getModelFile())
+    segmentation_cache.register(tokenizer, artifacts)
+    return tokenizer
+
 def get_tokenizers(all_trials):
     tokenizers = {}
+    # Trials that share artifacts (e.g. the L1 vocabulariser) share one tokenizer, and so its segmentation cache
+    built = {}
     for language in all_trials.keys():
         tokenizers[language] = {}
         for algo in all_trials[language].keys():
             tokenizers[language][algo] = []
             for artifacts, vocabulariser in all_trials[language][algo]:
-
-                if "SAGE" in algo:
-                    tok = FixedSageTokeniser(
-                        preprocessor=vocabulariser.preprocessor,
-                        vocab=artifacts.getVocabulary()
-                    )
-                elif "BPE" in algo:
-                    tok = HuggingFaceBPETokeniser(
-                        preprocessor=vocabulariser.preprocessor,
-                        vocab=artifacts.getVocabulary(),
-                        merges=artifacts.getMerges())
-                else: # KUDO
-                    tok = KudoPieceTokeniser(
-                        preprocessor=vocabulariser.preprocessor,
-                        model_file=artifacts.getModelFile())
-
-                tokenizers[language][algo].append(tok)
+                if id(artifacts) not in built:
+                    built[id(artifacts)] = build_tokenizer(algo, artifacts, vocabulariser)
+                tokenizers[language][algo].append(built[id(artifacts)])
     return tokenizers
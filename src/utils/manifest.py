@@ -0,0 +1,59 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+def get_file_checksum(path, chunk_size=1 << 20):
+    """
+    :param path: file path
+    :return: hex digest of the file content
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_stage_current(manifest_path, inputs):
+    """
+    Checks whether a stage can be skipped: its manifest was recorded with the same inputs, and all of its outputs
+    still exist with the recorded checksums
+    :param manifest_path: path of the stage manifest
+    :param inputs: JSON-serialisable description of the stage inputs (hashes, artifact identifiers, options)
+    :return: True if the stage does not need to run again
+    """
+    manifest_path = Path(manifest_path)
+    if not manifest_path.exists():
+        return False
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    # Compare through JSON, so tuples and lists describe the same inputs
+    if manifest["inputs"] != json.loads(json.dumps(inputs)):
+        return False
+    for path, checksum in manifest["outputs"].items():
+        if not Path(path).exists() or get_file_checksum(path) != checksum:
+            return False
+    return True
+
+
+def record_stage(manifest_path, inputs, outputs):
+    """
+    Records a finished stage. The manifest is written to a temporary file first, so a crash never leaves a
+    manifest for a stage that did not finish
+    :param manifest_path: path of the stage manifest
+    :param inputs: JSON-serialisable description of the stage inputs
+    :param outputs: paths of the files the stage wrote
+    """
+    manifest_path = Path(manifest_path)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    manifest = {
+        "inputs": inputs,
+        "outputs": {str(path): get_file_checksum(path) for path in outputs}
+    }
+    tmp_path = manifest_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
@@ -4,6 +4,20 @@ from bs4 import BeautifulSoup
 import re
 from training_data_utils import DATA_DIR
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import argparse
+
+WIKTIONARY_URL = "https://en.wiktionary.org/wiki/Appendix:Glossary_of_false_friends"
+DE_FF_PARQUET = "hf://datasets/aari1995/false_friends_en_de/data/train-00000-of-00001-957eef130c71ea88.parquet"
+FF_DIR_PATH = Path(DATA_DIR / 'raw' / 'ff_data')
+TABLE_COLS = ["False Friend", "Wrong Translation", "Correct Translation"]
+LANGUAGE_SET = {"french", "italian", "latin", "german", "dutch", "hungarian", "finnish", "estonian", "croatian",
+                "swedish", "danish",
+                "spanish", "portuguese", "esperanto", "polish", "romanian", "indonesian"}
+# Regex of 2 groups. 1st group matches the false friends words. 2nd group matches the languages which are in parentheses
+FF_LANGUAGES_PATTERN = re.compile(r"([^(]+)\s*\(([^)]+)\)")
+WORD_PATTERN = re.compile(r"\w+")
 
 
 def get_ff_languages(row_data, language_set):
@@ -14,24 +28,53 @@ def get_ff_languages(row_data, language_set):
     :param language_set: languages of interest
     :return: dictionary with key=language and value=ff
     """
-    # Regex of 2 groups. 1st group matches the false friends words. 2nd group matches the languages which are in parentheses
-    matches = re.findall(r"([^(]+)\s*\(([^)]+)\)", row_data)
+    matches = FF_LANGUAGES_PATTERN.findall(row_data)
     words_by_language = {}
 
     for words, languages in matches:
         # Some ff words can be written in different ways, which are split by the characters ",/"
         ff_words = [w.strip() for w in words.strip().replace("/", ",").split(",") if len(w.strip()) > 0]
-        # Some languages are seperated by "," or use the word "and"
-        ff_languages = [l.strip() for l in languages.replace("and", ",").split(",")]
 
-        for l in ff_languages:
-            if l.lower() not in language_set or len(ff_words) == 0:
+        for l in parse_languages(languages):
+            if l not in language_set or len(ff_words) == 0:
                 continue
-            words_by_language[l.lower()] = ff_words
+            words_by_language[l] = ff_words
 
     return words_by_language
 
 
+_parsed_languages = {}
+
+def parse_languages(languages):
+    """
+    Parses the languages in parentheses of a ff cell. The same few language lists repeat over the whole glossary, so
+    every list is only parsed once
+    :param languages: the text in parentheses
+    :return: list of lower case languages
+    """
+    if languages not in _parsed_languages:
+        # Some languages are seperated by "," or use the word "and"
+        _parsed_languages[languages] = [l.strip().lower() for l in languages.replace("and", ",").split(",")]
+    return _parsed_languages[languages]
+
+
+_word_patterns = {}
+
+def contains_word(word, row_words, row_data):
+    """
+    Checks if word is in the row as a whole word. A single word is in the row if it is one of the words of the row,
+    other candidates (e.g. with spaces or hyphens) are searched with a compiled regex that is cached per candidate
+    :param word: lower case candidate
+    :param row_words: set of the words of the lower case row
+    :param row_data: the lower case row
+    """
+    if WORD_PATTERN.fullmatch(word) is not None:
+        return word in row_words
+    if word not in _word_patterns:
+        _word_patterns[word] = re.compile(r"\b" + re.escape(word) + r"\b")
+    return _word_patterns[word].search(row_data) is not None
+
+
 def ff_filter(lang_ff_dic, row_data):
     """
     This function filters out ff words that are not written exactly the same as English
@@ -40,10 +83,12 @@ def ff_filter(lang_ff_dic, row_data):
     :return: updated lang_ff_dic
     """
     keys_to_remove = []
+    row_data = row_data.lower()
+    row_words = set(WORD_PATTERN.findall(row_data))
     for key, values in lang_ff_dic.items():
         for v in values:
             # finds if the ff word is in the 1st column data
-            if re.search(r"\b" + re.escape(v.lower()) + r"\b", row_data.lower()) is not None:
+            if contains_word(v.lower(), row_words, row_data):
                 lang_ff_dic[key] = v.lower()
                 break
             elif v == values[-1]:
@@ -68,61 +113,100 @@ def process_row(row_data, language_set):
     return lang_ff_dic
 
 
-def update_ff_tables(lang_ff_dict, ff_tables, table_cols):
+def collect_table_rows(table_html, language_set):
     """
-    This function creates and updates a pandas table for each language
-    :param lang_ff_dict: a dictionary with key=language and value=["False Friend", "Wrong English Translation", "Correct English Translation"]
-    :param ff_tables: a dictionary with key=language and value=pd.DataFrame
-    :param table_cols: table columns
-    :return: updated ff_tables
-    """
-    for l, row in lang_ff_dict.items():
-        if l not in ff_tables.keys():
-            ff_tables[l] = pd.DataFrame(columns=table_cols)
-        ff_tables[l].loc[len(ff_tables[l].index)] = row
-    return ff_tables
-
-
-url = "https://en.wiktionary.org/wiki/Appendix:Glossary_of_false_friends"
-page = requests.get(url)
-soup = BeautifulSoup(page.text, 'html.parser')
-# Gets all the tables in the wiktionary web page
-wiki_tables = soup.find_all('table', class_='wikitable')
-table_cols = ["False Friend", "Wrong Translation", "Correct Translation"]
-language_set = {"french", "italian", "latin", "german", "dutch", "hungarian", "finnish", "estonian", "croatian",
-                "swedish", "danish",
-                "spanish", "portuguese", "esperanto", "polish", "romanian", "indonesian"}
-
-# Creating pandas table for each language
-ff_tables = dict()
-for t in wiki_tables:
+    This function processes all the rows of one ff table and collects the processed rows of each language
+    :param table_html: the html of a wikitionary table
+    :param language_set: languages of interest
+    :return: a dictionary with key=language and value=list of ["False Friend", "Wrong English Translation", "Correct English Translation"]
+    """
+    ff_rows = dict()
     # Get all the table rows
-    table_rows = t.find_all('tr')
+    table_rows = BeautifulSoup(table_html, 'html.parser').find_all('tr')
     for row in table_rows:
         # Get all the data from the table row, i.e. row[i], 0<i<n
         row_data = row.find_all('td')
         row_data = [data.text.strip() for data in row_data][:3]
         # some rows are empty
         if len(row_data) > 0:
-            lang_ff_dict = process_row(row_data, language_set)
-            ff_tables = update_ff_tables(lang_ff_dict, ff_tables, table_cols)
+            for l, ff_row in process_row(row_data, language_set).items():
+                ff_rows.setdefault(l, []).append(ff_row)
+    return ff_rows
 
-FF_DIR_PATH = Path(DATA_DIR / 'raw' / 'ff_data')
-FF_DIR_PATH.mkdir(parents=True, exist_ok=True)
-
-for l, ff_df in ff_tables.items():
-    file_name = FF_DIR_PATH / f"{l}_ff.csv"
-    ff_df.to_csv(file_name, encoding="utf-8", index=False)
-
-
-df = pd.read_parquet("hf://datasets/aari1995/false_friends_en_de/data/train-00000-of-00001-957eef130c71ea88.parquet")
-ff_df = {"False Friend": [], "Correct Translation": [], "Wrong Translation": []}
-# Filtering out repetitions and words that are not written exactly the same
-for index, row in df.iterrows():
-    if row["False Friend"].lower() == row["Wrong English Translation"].lower() and row["False Friend"].lower() not in ff_df["False Friend"] and len(row["False Friend"].split(" ")) == 1:
-        ff_df["False Friend"].append(row["False Friend"].lower())
-        ff_df["Correct Translation"].append(row["Correct English Translation"].lower())
-        ff_df["Wrong Translation"].append(row["Wrong English Translation"].lower())
-de_ff_df = pd.DataFrame(ff_df)
-file_name = FF_DIR_PATH / "de_ff.csv"
-de_ff_df.to_csv(file_name, encoding="utf-8", index=False)
\ No newline at end of file
+
+def collect_ff_rows(wiki_tables, language_set, num_workers=None):
+    """
+    This function processes the ff tables in parallel, and collects the processed rows of each language in the order
+    of the tables
+    :param wiki_tables: the wikitionary tables
+    :param language_set: languages of interest
+    :param num_workers: number of processes, defaults to the number of cores
+    :return: a dictionary with key=language and value=list of rows
+    """
+    ff_rows = dict()
+    # The tables are sent to the workers as html, BeautifulSoup elements do not pickle
+    tables_html = [str(t) for t in wiki_tables]
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for table_rows in executor.map(collect_table_rows, tables_html, repeat(language_set)):
+            for l, rows in table_rows.items():
+                ff_rows.setdefault(l, []).extend(rows)
+    return ff_rows
+
+
+def build_ff_tables(ff_rows, table_cols):
+    """
+    This function creates a pandas table for each language at once, without repeated rows
+    :param ff_rows: a dictionary with key=language and value=list of rows
+    :param table_cols: table columns
+    :return: a dictionary with key=language and value=pd.DataFrame
+    """
+    return {l: pd.DataFrame(rows, columns=table_cols).drop_duplicates(ignore_index=True) for l, rows in ff_rows.items()}
+
+
+def get_wiktionary_html(html_path=None):
+    """
+    :param html_path: a saved snapshot of the glossary page, the page is downloaded if None
+    :return: the html of the wiktionary false friends glossary
+    """
+    if html_path is not None:
+        with open(html_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    return requests.get(WIKTIONARY_URL).text
+
+
+def prepare_wiktionary_ff(html, num_workers=None):
+    soup = BeautifulSoup(html, 'html.parser')
+    # Gets all the tables in the wiktionary web page
+    wiki_tables = soup.find_all('table', class_='wikitable')
+
+    # Creating pandas table for each language
+    ff_tables = build_ff_tables(collect_ff_rows(wiki_tables, LANGUAGE_SET, num_workers), TABLE_COLS)
+    for l, ff_df in ff_tables.items():
+        file_name = FF_DIR_PATH / f"{l}_ff.csv"
+        ff_df.to_csv(file_name, encoding="utf-8", index=False)
+
+
+def prepare_german_ff(parquet_path=DE_FF_PARQUET):
+    df = pd.read_parquet(parquet_path)
+    false_friend = df["False Friend"].str.lower()
+    correct = df["Correct English Translation"].str.lower()
+    wrong = df["Wrong English Translation"].str.lower()
+    # Filtering out repetitions and words that are not written exactly the same
+    keep = (false_friend == wrong) & ~df["False Friend"].str.contains(" ", regex=False)
+    de_ff_df = pd.DataFrame({"False Friend": false_friend[keep], "Correct Translation": correct[keep],
+                             "Wrong Translation": wrong[keep]})
+    de_ff_df = de_ff_df.drop_duplicates(subset="False Friend", ignore_index=True)
+    file_name = FF_DIR_PATH / "de_ff.csv"
+    de_ff_df.to_csv(file_name, encoding="utf-8", index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Prepares the false friends tables")
+    parser.add_argument("--html", default=None, help="saved snapshot of the wiktionary glossary, instead of downloading it")
+    parser.add_argument("--parquet", default=DE_FF_PARQUET, help="local copy of the German false friends parquet")
+    parser.add_argument("--num_workers", type=int, default=None, help="processes that parse the wiktionary tables")
+    args = parser.parse_args()
+
+    FF_DIR_PATH.mkdir(parents=True, exist_ok=True)
+    prepare_wiktionary_ff(get_wiktionary_html(args.html), args.num_workers)
+    prepare_german_ff(args.parquet)
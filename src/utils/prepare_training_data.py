@@ -1,20 +1,34 @@
-import random
 import re
 import os
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
 from training_data_utils import DATA_DIR, get_crosslingual_homographs
 from unicode import get_language_map
 
 TRAIN_DATA_DIR = DATA_DIR / 'raw' /'training_data'
+WORD_PATTERN = re.compile(r'\w+')
+ROW_NUMBER_PATTERN = re.compile(r'^\s*\d+\s*')
+OFFSETS_CACHE_DIR = DATA_DIR / 'cache' / 'line_offsets'
 
-def clean_training_data():
+def clean_training_data(num_workers=None):
+    """
+    Cleans all training corpora in parallel. Corpora that were already cleaned are skipped
+    """
+    file_paths = []
     for dir in dirs:
         if dir == "words":
             continue
         for l_file in os.listdir(TRAIN_DATA_DIR / dir):
             if l_file.endswith(".txt"):
-                file_path = TRAIN_DATA_DIR / dir / l_file
-                clean_row_numbers(file_path)
-                lower_case_corpus(file_path)
+                file_paths.append(TRAIN_DATA_DIR / dir / l_file)
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        for file_path, cleaned in zip(file_paths, executor.map(clean_corpus, file_paths)):
+            if cleaned:
+                print(f"Cleaned {file_path}")
 
 def get_directories(wd):
     dirs = []
@@ -23,52 +37,129 @@ def get_directories(wd):
             dirs.append(x)
     return dirs
 
-def create_multi_text_file(path1, path2, file_name, num_rows=300_000, seed=42):
+def create_multi_text_file(path1, path2, file_name, num_rows=300_000, seed=42, ratio=0.5):
     """
-    Creates a .txt file that combines two different text files by randomly sampling half of the lines
-    from each input file using a specific random seed.
+    Creates a .txt file that combines two different text files by randomly sampling lines
+    from each input file using a specific random seed. The input files are never read into memory: the sampled
+    lines are copied through the cached line offset index of each file. The inputs are clean corpora, so the output
+    is stamped clean as well.
 
     :param path1: Path to file of first language
     :param path2: Path to file of second language
     :param file_name: Name of the combined output file
-    :param num_rows: Total number of rows in the output file (half from each input)
+    :param num_rows: Total number of rows in the output file
     :param seed: Random seed for reproducibility
+    :param ratio: Fraction of the rows sampled from the first file, e.g. 0.1 for a 10/90 mixture
     """
-    rows_from_each = num_rows // 2
+    rows_from_first = round(num_rows * ratio)
+
+    with open(file_name, 'wb') as f_out:
+        copy_sampled_lines(path1, f_out, rows_from_first, seed)
+        copy_sampled_lines(path2, f_out, num_rows - rows_from_first, seed + 1)
+    stamp_clean(file_name)
 
-    with open(path1, 'r', encoding='utf-8') as f1:
-        lines1 = f1.readlines()
-    with open(path2, 'r', encoding='utf-8') as f2:
-        lines2 = f2.readlines()
+def get_offsets_cache_path(path):
+    path = Path(path).resolve()
+    stat = path.stat()
+    return OFFSETS_CACHE_DIR / f"{path.parent.name}_{path.name}_{stat.st_size}_{stat.st_mtime_ns}.npy"
+
+def build_line_offsets(path, chunk_size=1 << 24):
+    """
+    :param path: Path to the text file
+    :return: int64 array of the byte offset of every line, followed by the file size
+    """
+    offsets = [np.zeros(1, dtype=np.int64)]
+    position = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            newlines = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == ord("\n"))
+            offsets.append(newlines.astype(np.int64) + position + 1)
+            position += len(chunk)
+    offsets = np.concatenate(offsets)
+    # A last line without newline still is a line
+    if offsets[-1] != position:
+        offsets = np.append(offsets, position)
+    return offsets
 
-    random.seed(seed)
-    sampled1 = random.sample(lines1, rows_from_each)
-    random.seed(seed + 1)
-    sampled2 = random.sample(lines2, rows_from_each)
+def get_line_offsets(path):
+    """
+    Returns the line offset index of a file. The index is cached on disk, keyed by the size and mtime of the file
+    """
+    cache_path = get_offsets_cache_path(path)
+    if cache_path.exists():
+        return np.load(cache_path)
+    offsets = build_line_offsets(path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(f"{cache_path.stem}.{os.getpid()}.tmp.npy")
+    np.save(tmp_path, offsets)
+    os.replace(tmp_path, cache_path)
+    return offsets
 
-    with open(file_name, 'w', encoding='utf-8') as f_out:
-        f_out.writelines(sampled1 + sampled2)
+def copy_sampled_lines(path, f_out, k, seed):
+    """
+    Copies k lines, sampled without replacement, from a text file to an output file. The lines are read by seeking to
+    their offsets in file order, so memory does not depend on the size of the file.
+    :param path: Path to the text file
+    :param f_out: binary output file
+    :param k: Number of lines
+    :param seed: Random seed
+    """
+    offsets = get_line_offsets(path)
+    num_lines = len(offsets) - 1
+    rng = np.random.default_rng(seed)
+    indices = np.sort(rng.choice(num_lines, size=k, replace=False))
 
-def clean_row_numbers(file_path):
-    pattern = re.compile(r'^\s*\d+\s*')
+    with open(path, 'rb') as f:
+        for i in indices:
+            f.seek(offsets[i])
+            line = f.read(offsets[i + 1] - offsets[i])
+            f_out.write(line if line.endswith(b"\n") else line + b"\n")
 
-    # Read, clean, and overwrite
-    with open(file_path, 'r+', encoding='utf-8') as f:
-        lines = f.readlines()
-        f.seek(0)
-        f.truncate()
-        for line in lines:
-            cleaned_line = pattern.sub('', line)
-            f.write(cleaned_line)
+def get_clean_stamp_path(file_path):
+    return file_path.with_name(f"{file_path.name}.clean")
 
-def lower_case_corpus(path):
-    with open(path, "r", encoding="utf-8") as f:
-        content = f.read()
+def get_file_stamp(file_path):
+    stat = os.stat(file_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
 
-    lowercase_content = content.lower()
+def is_clean(file_path):
+    stamp_path = get_clean_stamp_path(file_path)
+    if not stamp_path.exists():
+        return False
+    with open(stamp_path, 'r', encoding='utf-8') as f:
+        return f.read().strip() == get_file_stamp(file_path)
 
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(lowercase_content)
+def stamp_clean(file_path):
+    """
+    Marks a corpus as clean, once it is in place. The stamp is written to a temporary file that replaces the old
+    stamp, so an interrupted run never leaves a partial stamp
+    :param file_path: Path to the corpus
+    """
+    file_path = Path(file_path)
+    stamp_path = get_clean_stamp_path(file_path)
+    tmp_path = stamp_path.with_name(f"{stamp_path.name}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(get_file_stamp(file_path))
+    os.replace(tmp_path, stamp_path)
+
+def clean_corpus(file_path):
+    """
+    Strips the row numbers and lowercases a corpus in one streaming pass. The cleaned corpus is written to a
+    temporary file that replaces the original, and a stamp of the cleaned file is written next to it. Cleaning is
+    not idempotent (a sentence can start with a number), so corpora whose stamp matches are skipped.
+    :param file_path: Path to the corpus
+    :return: True if the corpus was cleaned, False if it was already clean
+    """
+    if is_clean(file_path):
+        return False
+
+    tmp_path = file_path.with_name(f"{file_path.name}.tmp")
+    with open(file_path, 'r', encoding='utf-8') as f, open(tmp_path, 'w', encoding='utf-8') as f_out:
+        for line in f:
+            f_out.write(ROW_NUMBER_PATTERN.sub('', line).lower())
+    os.replace(tmp_path, file_path)
+    stamp_clean(file_path)
+    return True
 
 def get_corpus_path_pairs(english_corpus_path, dirs):
     corpus_path_pairs = []
@@ -82,24 +173,60 @@ def get_corpus_path_pairs(english_corpus_path, dirs):
                     corpus_path_pairs.append([("en", english_corpus_path), (dir, file_path)])
     return corpus_path_pairs
 
-def create_monolingual_cues_corpus(language, path, homographs, l_cues_map):
+_cue_replacements = {}
+
+def _init_cue_worker(replacements):
+    global _cue_replacements
+    _cue_replacements = replacements
+
+def _replace_word(match):
+    word = match.group(0)
+    return _cue_replacements.get(word, word)
+
+def _cue_lines(lines):
+    return [WORD_PATTERN.sub(_replace_word, line) for line in lines]
+
+def iterate_line_chunks(f, chunk_size):
+    while True:
+        chunk = list(islice(f, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def create_monolingual_cues_corpus(language, path, homographs, l_cues_map, num_workers=None, chunk_size=10_000):
+    """
+    Writes a copy of the corpus where the first letter of every homograph is replaced by its language cue.
+    Chunks of lines are cued in worker processes and written in their original order. At most two chunks per worker
+    are in flight, so reading never runs ahead of writing. The input is a clean corpus, so the output is stamped clean
+    as well.
+    :param language: language tag of the output file
+    :param path: Path to the corpus
+    :param homographs: set of homographs
+    :param l_cues_map: map of ascii letter --> cue
+    :param num_workers: number of processes, defaults to the number of cores
+    :param chunk_size: number of lines per chunk
+    :return: path of the cued corpus
+    """
     if "en" in language:
         output_path = TRAIN_DATA_DIR / "en" / f"{language}_cues.txt"
     else:
         output_path = TRAIN_DATA_DIR / language / f"{language}_cues.txt"
 
-    with open(path, 'r', encoding='utf-8') as f, open(output_path, 'w', encoding='utf-8') as f_out:
-        for line in f:
-            parts = re.split(r'(\w+)', line)
-
-            for i in range(len(parts)):
-                word = parts[i]
-                # Check if this part is a word we need to modify
-                if word in homographs:
-                    letter_cue = l_cues_map[word[0]]
-                    parts[i] = f"{letter_cue}{word[1:]}"
+    # Every homograph is cued once here, the workers only look words up.
+    # Homographs starting with a letter without a cue are left as they are.
+    replacements = {word: f"{l_cues_map[word[0]]}{word[1:]}" for word in homographs if word[:1] in l_cues_map}
 
-            f_out.write("".join(parts))
+    num_workers = num_workers or os.cpu_count()
+    with open(path, 'r', encoding='utf-8') as f, open(output_path, 'w', encoding='utf-8') as f_out, \
+            ProcessPoolExecutor(num_workers, initializer=_init_cue_worker, initargs=(replacements,)) as executor:
+        pending = deque()
+        for lines in iterate_line_chunks(f, chunk_size):
+            if len(pending) >= 2 * num_workers:
+                f_out.writelines(pending.popleft().result())
+            pending.append(executor.submit(_cue_lines, lines))
+        while pending:
+            f_out.writelines(pending.popleft().result())
+    stamp_clean(output_path)
     return output_path
 
 def create_multilingual_cues_corpus(language_pair_data):
@@ -113,15 +240,17 @@ def create_multilingual_cues_corpus(language_pair_data):
     create_multi_text_file(en_l_cues_corpus_path, l2_l_cues_corpus_path, file_name)
 
 
-dirs = get_directories(TRAIN_DATA_DIR)
-clean_training_data()
-corpus_path_pairs = get_corpus_path_pairs(TRAIN_DATA_DIR / 'en' / 'eng-simple_wikipedia_2021_300K-sentences.txt', dirs)
-for corpus_pair in corpus_path_pairs:
-    english_data = corpus_pair[0]
-    l2_data = corpus_pair[1]
-    file_name = TRAIN_DATA_DIR / l2_data[0] / f"{english_data[0]}_{l2_data[0]}.txt"
-    create_multi_text_file(english_data[1], l2_data[1], file_name)
-    create_multilingual_cues_corpus(corpus_pair)
+# The worker processes must not rerun the preparation when they import this module
+if __name__ == '__main__':
+    dirs = get_directories(TRAIN_DATA_DIR)
+    clean_training_data()
+    corpus_path_pairs = get_corpus_path_pairs(TRAIN_DATA_DIR / 'en' / 'eng-simple_wikipedia_2021_300K-sentences.txt', dirs)
+    for corpus_pair in corpus_path_pairs:
+        english_data = corpus_pair[0]
+        l2_data = corpus_pair[1]
+        file_name = TRAIN_DATA_DIR / l2_data[0] / f"{english_data[0]}_{l2_data[0]}.txt"
+        create_multi_text_file(english_data[1], l2_data[1], file_name)
+        create_multilingual_cues_corpus(corpus_pair)
 
 
 
@@ -2,9 +2,10 @@ from pathlib import Path
 
 STATS_DIR = Path(Path(__file__).resolve().parent.parent.parent) / 'stats_results'
 
-def create_results_directory(data):
+def create_results_directory(data, vocab_size=None):
     Path(STATS_DIR).mkdir(parents=True, exist_ok=True)
-    vocab_size = data['vocab_size']
+    if vocab_size is None:
+        vocab_size = data['vocab_size']
     algos = data['algos']
     # l1 = data['l1']['language']
     l2 = [data['l2'][i]['language'] for i in range(len(data['l2']))]
@@ -15,4 +16,10 @@ def create_results_directory(data):
             Path(STATS_DIR / f"{vocab_size}" / f"{l}" / f"{algo}" / "stats").mkdir(parents=True, exist_ok=True)
 
 def get_results_directory(v, l, algo):
-    return Path(STATS_DIR / f"{v}" / f"{l}" / f"{algo}")
\ No newline at end of file
+    return Path(STATS_DIR / f"{v}" / f"{l}" / f"{algo}")
+
+def get_comparison_directory(l):
+    return Path(STATS_DIR / "comparisons" / f"{l}")
+
+def get_manifest_path(v, l, algo, stage):
+    return Path(STATS_DIR / f"{v}" / f"{l}" / f"{algo}" / "manifests" / f"{stage}.json")
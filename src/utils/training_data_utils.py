@@ -1,5 +1,12 @@
-from datasets import Dataset, DatasetInfo
+from datasets import Dataset, Features, Value
+import numpy as np
+import pandas as pd
 import csv
+import mmap
+import os
+import hashlib
+import sys
+from collections import OrderedDict, Counter
 from pathlib import Path
 import random
 
@@ -9,39 +16,170 @@ WORDS_DATA_DIR = DATA_DIR / 'raw' /'training_data' / 'words'
 
 LANGUAGE_DICT_DIR = DATA_DIR / 'raw' / 'all_words_in_all_languages'
 
+CORPUS_CACHE_DIR = DATA_DIR / 'cache' / 'corpora'
+
+HOMOGRAPHS_CACHE_DIR = DATA_DIR / 'cache' / 'homographs'
+
+WORDS_CACHE_DIR = DATA_DIR / 'cache' / 'words'
+
+DICTIONARY_CACHE_DIR = DATA_DIR / 'cache' / 'dictionaries'
+
+LANGUAGES_MAP = {"en": "English", "fr": "French", "es": "Spanish", "de": "German", "se": "Swedish", "it": "Italian", "ro": "Romanian"}
+
+def get_corpus_words_path(language):
+    path = Path(WORDS_DATA_DIR / language)
+    word_file = [p.name for p in path.iterdir() if p.is_file()]
+    return path / word_file[0]
+
+
+def read_corpus_words(path):
+    """
+    Parses a word frequency file (id, word, frequency per tab separated line) and sums the frequencies of the lower
+    cased words
+    :param path: word frequency file path
+    :return: DataFrame with columns word and freq, in order of first appearance
+    """
+    # Words are taken literally: no quoting, and words like "null" or "nan" are not missing values
+    words = pd.read_csv(path, sep="\t", header=None, names=["id", "word", "freq"], usecols=["word", "freq"],
+                        dtype={"word": str, "freq": "int64"}, engine="c", quoting=csv.QUOTE_NONE,
+                        keep_default_na=False, na_filter=False, encoding="utf-8")
+    words["word"] = words["word"].str.lower()
+    return words.groupby("word", sort=False, as_index=False)["freq"].sum()
+
+
+_corpus_words = {}
+
 def get_corpus_words(language):
     """
     Get the word frequencies of words for language in the file path. Looks at all words as lower case, so the word
-    "a" and "A" are considered the same
+    "a" and "A" are considered the same. The parsed table is cached as Parquet, and recomputed when the word file is
+    newer than the cache
     :param path: word frequency file path
     :return: dictionary --> {word: word_frequency}
     """
-    path = Path(WORDS_DATA_DIR / language)
-    word_file = [p.name for p in path.iterdir() if p.is_file()]
-    path = path / word_file[0]
-    word_frequencies = dict()
-    with open(path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-    for line in lines:
-        word, freq = line.split("\t")[1:]
-        # only lower case words
-        word = word.lower()
-        if word in word_frequencies.keys():
-            word_frequencies[word] = word_frequencies[word] + int(freq.strip())
-        else:
-            word_frequencies[word] = int(freq.strip())
-    return word_frequencies
+    path = get_corpus_words_path(language)
+    # The cache can not live next to the word file, get_corpus_words_path takes the only file of the directory
+    cache_path = WORDS_CACHE_DIR / language / f"{path.name}.parquet"
+    key = (str(path), path.stat().st_mtime_ns)
+    if key in _corpus_words:
+        return _corpus_words[key]
+
+    if cache_path.exists() and cache_path.stat().st_mtime_ns >= path.stat().st_mtime_ns:
+        words = pd.read_parquet(cache_path)
+    else:
+        words = read_corpus_words(path)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.tmp")
+        words.to_parquet(tmp_path, index=False)
+        tmp_path.replace(cache_path)
+
+    _corpus_words[key] = dict(zip(words["word"].tolist(), words["freq"].tolist()))
+    return _corpus_words[key]
+
+
+def get_language_dictionary_path(language):
+    return LANGUAGE_DICT_DIR / LANGUAGES_MAP[language] / f"{LANGUAGES_MAP[language]}.txt"
 
 
 def get_language_dictionary(language):
 
-    languages_map = {"en": "English", "fr": "French", "es": "Spanish", "de": "German", "se": "Swedish", "it": "Italian", "ro": "Romanian"}
-    path = LANGUAGE_DICT_DIR / languages_map[language] / f"{languages_map[language]}.txt"
+    path = get_language_dictionary_path(language)
     with open(path, "r", encoding="utf-8") as f1:
         line1 = f1.readlines()[0].strip().lower().split(",")
     return set(line1)
 
 
+class DictionaryIndex:
+    """
+    Read-only word set stored on disk as a sorted, deduplicated table of UTF-8 strings: one blob with all the words
+    and an int64 array with the offset of every word in the blob. Both files are memory-mapped, so an index costs no
+    memory until it is searched, and membership is a binary search.
+    """
+
+    def __init__(self, blob_path, offsets_path):
+        self.offsets = np.load(offsets_path, mmap_mode="r")
+        self.blob = b""
+        if os.path.getsize(blob_path) > 0:
+            with open(blob_path, "rb") as f:
+                self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _get(self, i):
+        return self.blob[int(self.offsets[i]):int(self.offsets[i + 1])]
+
+    def __contains__(self, word):
+        # UTF-8 bytes sort like their code points, so the blob order is the order of the words
+        key = word.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._get(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < len(self) and self._get(lo) == key
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._get(i).decode("utf-8")
+
+    def intersection(self, words):
+        """
+        :param words: iterable of words, typically much smaller than the index
+        :return: set of the words that are in the index
+        """
+        return {w for w in words if w in self}
+
+    @staticmethod
+    def build(words, blob_path, offsets_path):
+        """
+        Writes the index files of a collection of words. Both files are written to temporary files first, so an
+        interrupted build never leaves a partial index
+        :return: the DictionaryIndex
+        """
+        encoded = sorted({w.encode("utf-8") for w in words})
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.array([len(w) for w in encoded], dtype=np.int64), out=offsets[1:])
+
+        tmp_blob_path = blob_path.with_name(f"{blob_path.name}.{os.getpid()}.tmp")
+        tmp_offsets_path = offsets_path.with_name(f"{offsets_path.stem}.{os.getpid()}.tmp.npy")
+        with open(tmp_blob_path, "wb") as f:
+            f.write(b"".join(encoded))
+        np.save(tmp_offsets_path, offsets)
+        # The offsets are replaced last, they mark a complete index
+        os.replace(tmp_blob_path, blob_path)
+        os.replace(tmp_offsets_path, offsets_path)
+        return DictionaryIndex(blob_path, offsets_path)
+
+
+_dictionary_indexes = {}
+
+def get_dictionary_index(language):
+    """
+    Returns the dictionary of a language as a memory-mapped DictionaryIndex. The index is built from the dictionary
+    file once, and rebuilt when the size or modification time of the file changes
+    :param language: language code
+    :return: DictionaryIndex of the lower cased dictionary words
+    """
+    path = get_language_dictionary_path(language)
+    stat = path.stat()
+    name = f"{LANGUAGES_MAP[language]}_{stat.st_size}_{stat.st_mtime_ns}"
+    if name in _dictionary_indexes:
+        return _dictionary_indexes[name]
+
+    blob_path = DICTIONARY_CACHE_DIR / f"{name}.words"
+    offsets_path = DICTIONARY_CACHE_DIR / f"{name}.offsets.npy"
+    if offsets_path.exists() and blob_path.exists():
+        index = DictionaryIndex(blob_path, offsets_path)
+    else:
+        DICTIONARY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        index = DictionaryIndex.build(get_language_dictionary(language), blob_path, offsets_path)
+    _dictionary_indexes[name] = index
+    return index
+
+
 def filter_words_by_frequency(word_freqs, threshold=30):
     filtered_words = {}
     for word, freq in word_freqs.items():
@@ -56,12 +194,55 @@ def filter_words_by_len(word_freqs, length=2):
             filtered_words[word] = freq
     return filtered_words
 
-def get_crosslingual_homographs(l1, l2):
-    l1_dict = get_language_dictionary(l1)
-    l2_dict = get_language_dictionary(l2)
-    l1_corpus_words = set(filter_words_by_len(filter_words_by_frequency(get_corpus_words(l1))).keys())
-    l2_corpus_words = set(filter_words_by_len(filter_words_by_frequency(get_corpus_words(l2))).keys())
-    return l1_dict & l2_dict & l1_corpus_words & l2_corpus_words
+def compute_crosslingual_homographs(l1, l2, freq_threshold=30, len_threshold=2):
+    l1_dict = get_dictionary_index(l1)
+    l2_dict = get_dictionary_index(l2)
+    l1_corpus_words = set(filter_words_by_len(filter_words_by_frequency(get_corpus_words(l1), freq_threshold), len_threshold).keys())
+    l2_corpus_words = set(filter_words_by_len(filter_words_by_frequency(get_corpus_words(l2), freq_threshold), len_threshold).keys())
+    # Only the (small) frequent corpus words are looked up in the dictionaries
+    return l2_dict.intersection(l1_dict.intersection(l1_corpus_words & l2_corpus_words))
+
+
+_homographs = {}
+
+def get_crosslingual_homographs(l1, l2, freq_threshold=30, len_threshold=2):
+    """
+    Returns the words that appear in the dictionaries and frequent word lists of both languages. The result is
+    cached in memory and on disk as a sorted word list. The first line of the cache file stamps the size and
+    modification time of the source files, so the cache is recomputed when any of them changes. The cache file is
+    written to a temporary file first, so other processes never read a partial word list
+    :param l1: the first language
+    :param l2: the second language
+    :param freq_threshold: minimal corpus frequency of a homograph in each language
+    :param len_threshold: homographs must be longer than this
+    :return: frozenset of homographs
+    """
+    key = (l1, l2, freq_threshold, len_threshold)
+    if key in _homographs:
+        return _homographs[key]
+
+    sources = [get_language_dictionary_path(l1), get_language_dictionary_path(l2),
+               get_corpus_words_path(l1), get_corpus_words_path(l2)]
+    stamp = " ".join(f"{p.stat().st_size}:{p.stat().st_mtime_ns}" for p in sources)
+    cache_path = HOMOGRAPHS_CACHE_DIR / f"{l1}_{l2}_f{freq_threshold}_l{len_threshold}.txt"
+
+    homographs = None
+    if cache_path.exists():
+        with open(cache_path, "r", encoding="utf-8") as f:
+            if f.readline().rstrip("\n") == stamp:
+                homographs = frozenset(line.rstrip("\n") for line in f)
+
+    if homographs is None:
+        homographs = frozenset(compute_crosslingual_homographs(l1, l2, freq_threshold, len_threshold))
+        HOMOGRAPHS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(stamp + "\n")
+            f.writelines(f"{w}\n" for w in sorted(homographs))
+        os.replace(tmp_path, cache_path)
+
+    _homographs[key] = homographs
+    return homographs
 
 
 
@@ -71,11 +252,114 @@ def get_ff_by_path(path):
         return list(csv.DictReader(f))
 
 
-def load_local_corpus_to_hf(path):
+_corpus_fingerprints = {}
+
+def get_corpus_fingerprint(path, chunk_size=1 << 20):
+    """
+    Computes a content hash of a corpus file by streaming it in chunks. The hash is memoized per process on the
+    file's path, size and modification time, so each file is only read once as long as it does not change
+    :param path: corpus file path
+    :param chunk_size: number of bytes read at a time
+    :return: hex digest of the file content
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    memo_key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _corpus_fingerprints:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        _corpus_fingerprints[memo_key] = digest.hexdigest()
+    return _corpus_fingerprints[memo_key]
+
+
+def _iterate_corpus_lines(path, fingerprint):
+    """
+    Yields the non-empty, stripped lines of a corpus file. The fingerprint is not used here, but it is part of the
+    generator arguments, so the Arrow cache of a corpus is rebuilt whenever the file changes
+    """
     with open(path, "r", encoding="utf-8") as f:
-        lines = [line.strip() for line in f if line.strip()]
-    info = DatasetInfo(dataset_name=f"{Path(path).stem}")
-    return Dataset.from_dict({"text": lines}, info=info)
+        for line in f:
+            line = line.strip()
+            if line:
+                yield {"text": line}
+
+
+def load_local_corpus_to_hf(path):
+    """
+    Loads a corpus file as an Arrow-backed dataset. The file is streamed into an Arrow cache on disk once, after
+    which the dataset is memory-mapped, so the text is never held as a Python list
+    :param path: corpus file path
+    :return: Dataset with a single "text" column
+    """
+    dataset = Dataset.from_generator(
+        _iterate_corpus_lines,
+        features=Features({"text": Value("string")}),
+        cache_dir=str(CORPUS_CACHE_DIR),
+        gen_kwargs={"path": str(path), "fingerprint": get_corpus_fingerprint(path)}
+    )
+    dataset.info.dataset_name = Path(path).stem
+    return dataset
+
+class CorpusCache:
+    """
+    Process-wide LRU cache of loaded corpora and their word counts, keyed on path and modification time. The least
+    recently used entries are evicted once the cached entries take more than max_bytes.
+    """
+
+    def __init__(self, max_bytes=4 * 1024 ** 3):
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.corpora = OrderedDict()
+
+    def _get_or_load(self, key, load, get_num_bytes):
+        if key in self.corpora:
+            self.corpora.move_to_end(key)
+            return self.corpora[key][0]
+
+        value = load()
+        num_bytes = get_num_bytes(value)
+        self.corpora[key] = (value, num_bytes)
+        self.num_bytes += num_bytes
+
+        # Always keep the entry that was just loaded
+        while self.num_bytes > self.max_bytes and len(self.corpora) > 1:
+            _, (_, evicted_bytes) = self.corpora.popitem(last=False)
+            self.num_bytes -= evicted_bytes
+        return value
+
+    def get(self, path):
+        """
+        :param path: corpus file path
+        :return: the corpus as a Dataset, loaded at most once while it stays cached
+        """
+        path = Path(path).resolve()
+        key = ("corpus", str(path), path.stat().st_mtime_ns)
+        return self._get_or_load(key, lambda: load_local_corpus_to_hf(path), lambda dataset: dataset.data.nbytes)
+
+    def get_word_counts(self, path):
+        """
+        :param path: corpus file path
+        :return: Counter of the whitespace word types of the corpus, counted at most once while it stays cached
+        """
+        path = Path(path).resolve()
+        key = ("word_counts", str(path), path.stat().st_mtime_ns)
+        return self._get_or_load(key, lambda: Counter(CorpusWordStream(path)), get_counter_size)
+
+
+def get_counter_size(counter):
+    """
+    :return: approximate size in bytes of a Counter of strings, its hash table and its keys
+    """
+    return sys.getsizeof(counter) + sum(sys.getsizeof(word) for word in counter)
+
+
+corpus_cache = CorpusCache()
+
+def get_cached_corpus(path):
+    return corpus_cache.get(path)
+
 
 def load_local_corpus_random_sample(path, limit=None):
     with open(path, "r", encoding="utf-8") as f:
@@ -91,15 +375,28 @@ class CorpusWordStream:
     Iterable wrapper for corpus words to support multiple passes (re-iterable).
     Required by tktkt.util.types.NamedIterable.
     """
-    def __init__(self, dataset):
-        self.dataset = dataset
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
 
     def __iter__(self):
-        for line in self.dataset['text']:
-            # Basic whitespace splitting
-            for word in line.strip().split():
-                if word:
-                    yield word
-
-def get_corpus_word_stream(dataset):
-    return CorpusWordStream(dataset)
\ No newline at end of file
+        # Read the memory-mapped dataset in batches instead of materialising the whole text column
+        dataset = get_cached_corpus(self.path)
+        for batch in dataset.iter(batch_size=self.batch_size):
+            for line in batch['text']:
+                # Basic whitespace splitting
+                for word in line.strip().split():
+                    if word:
+                        yield word
+
+def get_corpus_word_stream(path):
+    return CorpusWordStream(path)
+
+
+def count_corpus_words(path):
+    """
+    Counts the whitespace word types of a corpus. The counts are kept in the corpus cache, within its byte budget.
+    :param path: corpus file path
+    :return: Counter --> {word: frequency}
+    """
+    return corpus_cache.get_word_counts(path)
@@ -1,5 +1,6 @@
 import unicodedata as ud
 import string
+from types import MappingProxyType
 
 
 def is_stable(ch):
@@ -79,6 +80,11 @@ def build_language_maps():
     return out
 
 
+# Code points are only scanned once per process, shorter requests are served from the longest scan so far
+_safe_latin_chars = []
+_safe_latin_scan = [0x0180]
+
+
 def get_safe_latin_chars(limit=100):
     """
     Returns a list of 'limit' safe lowercase Latin characters starting from U+0180.
@@ -87,10 +93,11 @@ def get_safe_latin_chars(limit=100):
     2. Stable under ALL normalizations (NFC, NFD, NFKC, NFKD)
     This prevents tokenizer crashes and ensures robust invertibility.
     """
-    safe_chars = []
-    current_cp = 0x0180
+    safe_chars = _safe_latin_chars
+    current_cp = _safe_latin_scan[0]
 
-    while len(safe_chars) < limit:
+    # Increased limit to find enough stable chars given strict filtering
+    while len(safe_chars) < limit and current_cp <= 0x2FFF:
         char = chr(current_cp)
 
         # 1. Must be Lowercase
@@ -100,28 +107,41 @@ def get_safe_latin_chars(limit=100):
                 safe_chars.append(char)
 
         current_cp += 1
-        # Increased limit to find enough stable chars given strict filtering
-        if current_cp > 0x2FFF:
-            break
 
-    return safe_chars
+    _safe_latin_scan[0] = current_cp
+    return safe_chars[:limit]
 
 
-def get_language_map():
-    return build_language_maps()
+_language_maps = {}
 
 
-def get_inverse_language_map():
-    l_map = get_language_map()
-    inv_map = {}
+def get_language_map():
+    """
+    The language cue maps are built once per process and shared, so they are returned read-only
+    :return: read-only mapping --> {language: {ascii letter: cue}}
+    """
+    if "forward" not in _language_maps:
+        _language_maps["forward"] = MappingProxyType(
+            {lang: MappingProxyType(mapping) for lang, mapping in build_language_maps().items()})
+    return _language_maps["forward"]
 
-    for lang, mapping in l_map.items():
-        inv = {}
-        for ascii_letter, cue_char in mapping.items():
-            inv[cue_char] = ascii_letter
-        inv_map[lang] = inv
 
-    return inv_map
+def get_inverse_language_map():
+    """
+    :return: read-only mapping --> {language: {cue: ascii letter}}
+    """
+    if "inverse" not in _language_maps:
+        l_map = get_language_map()
+        inv_map = {}
+
+        for lang, mapping in l_map.items():
+            inv = {}
+            for ascii_letter, cue_char in mapping.items():
+                inv[cue_char] = ascii_letter
+            inv_map[lang] = MappingProxyType(inv)
+
+        _language_maps["inverse"] = MappingProxyType(inv_map)
+    return _language_maps["inverse"]
 
 # LANG_CUE = build_language_maps()
 
@@ -0,0 +1,65 @@
+import os
+import pickle
+from pathlib import Path
+from tktkt.util.strings import shash
+from src.utils.training_data_utils import get_corpus_fingerprint
+
+ARTIFACT_STORE_DIR = Path(Path(__file__).resolve().parent.parent.parent) / 'artifact_store'
+
+
+def get_artifact_key(algo, vocab_size, preprocessor, training_data_path):
+    """
+    Returns the content address of a vocabulariser artifact. The language tag is not part of the key, since it does
+    not change what is trained
+    :param algo: algorithm name
+    :param vocab_size: vocabulary size
+    :param preprocessor: the preprocessor the vocabulariser trains with
+    :param training_data_path: training corpus path
+    :return: key string
+    """
+    return f"{algo}_{vocab_size}_{shash(repr(preprocessor))}_{get_corpus_fingerprint(training_data_path)}"
+
+
+class ArtifactStore:
+    """
+    Content-addressed store of trained vocabulariser artifacts. Artifacts are kept in memory for the current run and
+    pickled to disk so later runs (and other processes of the same run) can reuse them.
+    """
+
+    def __init__(self, directory=ARTIFACT_STORE_DIR):
+        self.directory = Path(directory)
+        self.artifacts = {}
+
+    def _get_path(self, key):
+        return self.directory / f"{key}.pkl"
+
+    def get(self, key):
+        """
+        :param key: artifact key
+        :return: the stored artifacts, or None if they were never trained
+        """
+        if key not in self.artifacts:
+            path = self._get_path(key)
+            if not path.exists():
+                return None
+            with open(path, "rb") as f:
+                self.artifacts[key] = pickle.load(f)
+        return self.artifacts[key]
+
+    def put(self, key, artifacts):
+        """
+        Stores artifacts under key. The pickle is written to a temporary file first, so concurrent training
+        processes never read a partial file
+        """
+        self.artifacts[key] = artifacts
+        path = self._get_path(key)
+        if path.exists():
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(artifacts, f)
+        os.replace(tmp_path, path)
+
+
+artifact_store = ArtifactStore()
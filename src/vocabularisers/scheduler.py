@@ -0,0 +1,122 @@
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from .train_vocabularisers import train_vocabulariser, get_vocabulariser, get_base_job, get_training_key, \
+    get_stored_base_artifacts
+from .artifact_store import artifact_store
+
+
+def get_job_dependency(job):
+    """
+    Returns the job that has to finish before the given job can start. A training job is a tuple of
+    (algo, language, vocab_size, training_data_path, sweep). SAGE jobs depend on their x8 base BPE/UNI job, and
+    jobs derived in a vocabulary-size sweep depend on the job of the next larger size.
+    :param job: training job
+    :return: the training job it depends on, or None
+    """
+    return get_base_job(*job)
+
+
+def get_stored_artifacts(job):
+    """
+    :return: the artifacts of a training job from the artifact store, or None if it was never trained
+    """
+    algo, _, vocab_size, training_data_path, sweep = job
+    return artifact_store.get(get_training_key(algo, vocab_size, training_data_path, sweep))
+
+
+def load_trained_job(job, artifacts=None):
+    """
+    Loads a trained job: its artifacts from the artifact store and its (untrained) vocabulariser
+    :param job: training job
+    :param artifacts: the artifacts, if they are already loaded
+    :return: (artifacts, vocabulariser)
+    """
+    if artifacts is None:
+        artifacts = get_stored_artifacts(job)
+        if artifacts is None:
+            raise ValueError(f"Training job {job} is not in the artifact store")
+    algo, language, vocab_size, training_data_path, sweep = job
+    base_artifacts = get_stored_base_artifacts(algo, language, vocab_size, training_data_path, sweep, artifacts)
+    vocabulariser = get_vocabulariser(algo, language, vocab_size, training_data_path, sweep,
+                                      base_artifacts=base_artifacts)
+    return artifacts, vocabulariser
+
+
+def build_job_graph(jobs, stored):
+    """
+    Builds the dependency graph of the training jobs that still have to be trained. Identical jobs are only added
+    once, and the base jobs of SAGE jobs are added even if they were not requested. Jobs in the artifact store are
+    left out, and so are the jobs they depend on.
+    :param jobs: list of training jobs
+    :param stored: dictionary the artifacts of stored jobs are collected in --> {job: artifacts}
+    :return: dictionary --> {job: job it depends on or None}
+    """
+    graph = {}
+    for job in jobs:
+        while job is not None and job not in graph and job not in stored:
+            artifacts = get_stored_artifacts(job)
+            if artifacts is not None:
+                stored[job] = artifacts
+                break
+            graph[job] = get_job_dependency(job)
+            job = graph[job]
+    return graph
+
+
+def _train_job(job, base_artifacts):
+    """
+    Process pool entry point. Only the artifacts are sent back, the vocabulariser is rebuilt by the caller.
+    """
+    algo, language, vocab_size, training_data_path, sweep = job
+    artifacts, _ = train_vocabulariser(algo, language, vocab_size, training_data_path, sweep,
+                                       base_artifacts=base_artifacts)
+    return artifacts
+
+
+def _get_ready_jobs(graph, waiting, artifacts):
+    """
+    Returns the waiting jobs whose dependency is done. Jobs that other jobs depend on come first, so the longest
+    dependency chains start as early as possible
+    """
+    num_dependents = {}
+    for dependency in graph.values():
+        if dependency is not None:
+            num_dependents[dependency] = num_dependents.get(dependency, 0) + 1
+
+    ready = [job for job in waiting if graph[job] is None or graph[job] in artifacts]
+    return sorted(ready, key=lambda job: num_dependents.get(job, 0), reverse=True)
+
+
+def run_training_jobs(jobs, num_workers=1):
+    """
+    Trains all the jobs and their dependencies. Independent jobs run concurrently in a process pool with up to
+    num_workers processes. With num_workers <= 1 the jobs are trained one at a time in this process.
+    :param jobs: list of training jobs
+    :param num_workers: maximal number of training processes
+    :return: dictionary --> {job: (artifacts, vocabulariser)}
+    """
+    # Jobs already in the artifact store are not scheduled at all
+    artifacts = {}
+    graph = build_job_graph(jobs, artifacts)
+    waiting = set(graph.keys())
+
+    if num_workers <= 1:
+        while waiting:
+            for job in _get_ready_jobs(graph, waiting, artifacts):
+                waiting.remove(job)
+                artifacts[job] = _train_job(job, artifacts.get(graph[job]))
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            pending = {}
+            while waiting or pending:
+                for job in _get_ready_jobs(graph, waiting, artifacts):
+                    waiting.remove(job)
+                    pending[executor.submit(_train_job, job, artifacts.get(graph[job]))] = job
+
+                done, _ = wait(pending.keys(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = pending.pop(future)
+                    artifacts[job] = future.result()
+                    artifact_store.put(get_training_key(job[0], job[2], job[3], job[4]), artifacts[job])
+                    print(f"Finished training {job[0]} ({job[1]}, V={job[2]})")
+
+    return {job: load_trained_job(job, job_artifacts) for job, job_artifacts in artifacts.items()}
@@ -0,0 +1,92 @@
+from tktkt.interfaces.identifiers import Vocab
+
+
+def get_sweep(algo, vocab_size, vocab_sizes):
+    """
+    Returns the larger sizes of a vocabulary-size sweep that the vocabulary of this size is derived through.
+    SAGE vocabularies continue pruning from the next larger SAGE vocabulary, so they are derived through every larger
+    size. Chained pruning does not give the same vocabulary as pruning from the x8 base, so the sweep is part of the
+    artifact key and of the SAGE vocabulariser identifier. BPE vocabularies are truncated from the largest BPE
+    vocabulary, which gives the same vocabulary as training that size. UNI vocabularies are trained per size.
+    :param algo: algorithm name
+    :param vocab_size: vocabulary size
+    :param vocab_sizes: all vocabulary sizes of the sweep
+    :return: tuple of sizes, largest first. Empty if the vocabulary is trained from scratch
+    """
+    larger = sorted((size for size in vocab_sizes if size > vocab_size), reverse=True)
+    if len(larger) == 0:
+        return ()
+    if "SAGE" in algo:
+        return tuple(larger)
+    if "BPE" in algo:
+        return (larger[0],)
+    return ()
+
+
+def _get_merge_parts(merge):
+    # Merges are either tuples of the merged types or space-separated strings
+    if isinstance(merge, str):
+        return tuple(merge.split(" "))
+    return tuple(merge)
+
+
+def _get_merge_result(merge):
+    return "".join(_get_merge_parts(merge))
+
+
+class TruncatedBPEArtifacts:
+    """
+    BPE artifacts of a smaller vocabulary, derived from the artifacts of a larger one. BPE learns its merges greedily,
+    so the vocabulary of a smaller size is the alphabet plus a prefix of the merge list.
+    """
+
+    def __init__(self, artifacts, vocab_size):
+        self.artifacts = artifacts
+        self.vocab_size = vocab_size
+        self._validate()
+
+    def _validate(self):
+        """
+        Checks that the kept merges are a valid merge order on their own, i.e. every merge only merges atoms and
+        results of earlier kept merges, and that the vocabulary is exactly the atoms plus the kept merge results
+        :raise ValueError: if the artifacts cannot be truncated to this vocabulary size
+        """
+        vocab = self.artifacts.getVocabulary()
+        all_merge_results = {_get_merge_result(m) for m in self.artifacts.getMerges()}
+        available = {t for t in vocab if t not in all_merge_results}
+        for i, merge in enumerate(self.getMerges()):
+            missing = [part for part in _get_merge_parts(merge) if part not in available]
+            if missing:
+                raise ValueError(f"Merge {i} {merge} of the truncated BPE merges uses types that are not in the "
+                                 f"truncated vocabulary: {missing}")
+            result = _get_merge_result(merge)
+            if result not in vocab:
+                raise ValueError(f"Merge {i} {merge} has a result that is not in the BPE vocabulary: {result}")
+            if result in available:
+                raise ValueError(f"Merge {i} {merge} produces a type that is already in the truncated vocabulary")
+            available.add(result)
+
+        kept_types = set(self.getVocabulary())
+        if kept_types != available:
+            raise ValueError(f"Truncated BPE vocabulary has {len(kept_types)} types, but its atoms and merges "
+                             f"give {len(available)}")
+        if len(self.getMerges()) < len(self.artifacts.getMerges()) and len(kept_types) != self.vocab_size:
+            raise ValueError(f"Truncated BPE vocabulary has {len(kept_types)} types instead of {self.vocab_size}")
+
+    def _get_num_merges(self):
+        vocab = self.artifacts.getVocabulary()
+        merge_results = {_get_merge_result(m) for m in self.artifacts.getMerges()}
+        num_atoms = sum(1 for t in vocab if t not in merge_results)
+        return max(self.vocab_size - num_atoms, 0)
+
+    def getMerges(self):
+        return self.artifacts.getMerges()[:self._get_num_merges()]
+
+    def getVocabulary(self):
+        vocab = self.artifacts.getVocabulary()
+        all_merge_results = {_get_merge_result(m) for m in self.artifacts.getMerges()}
+        kept_merge_results = {_get_merge_result(m) for m in self.getMerges()}
+
+        ordered_types = sorted(vocab.keys(), key=vocab.get)
+        kept_types = [t for t in ordered_types if t not in all_merge_results or t in kept_merge_results]
+        return Vocab(ordered_types=kept_types, specials=vocab.specials, unk_id=vocab.UNK)
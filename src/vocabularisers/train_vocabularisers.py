@@ -1,8 +1,10 @@
 from src.vocabularisers.xSageVocabulariser import xSageVocabulariser
 from src.vocabularisers.xBPEVocabulariser import xBPEVocabulariser
 from src.vocabularisers.xKudoPieceVocabulariser import xKudoVocabulariser
-from src.utils.training_data_utils import load_local_corpus_to_hf, load_local_corpus_random_sample
+from src.utils.training_data_utils import get_cached_corpus, load_local_corpus_random_sample, get_corpus_fingerprint
 from src.preprocessors.cue_preprocessor import CuePreprocessor, CuePrefab2
+from src.vocabularisers.artifact_store import artifact_store, get_artifact_key
+from src.vocabularisers.sweep import TruncatedBPEArtifacts
 from tktkt.preparation.boundaries import BoundaryMarker, BoundaryMarkerLocation
 from tktkt.factories.preprocessors import ModernEnglishPreprocessor_SentencePieceCompatible
 
@@ -32,21 +34,109 @@ from tktkt.factories.preprocessors import ModernEnglishPreprocessor_SentencePiec
 # KudoPieceVocabulariser._callSentencePieceTrainer = staticmethod(patched_train)
 
 
-def train_vocabulariser(algo, language, vocab_size, training_data_path):
-    # TODO: dont forget to change back
-    corpus_ds = load_local_corpus_to_hf(training_data_path)
+def get_base_algo(algo):
+    """
+    Returns the algorithm that builds the initial vocabulary of a SAGE algorithm, e.g. "BPE" for "BPE_SAGE"
+    :param algo: algorithm name
+    :return: base algorithm name
+    """
+    return algo.split("_")[0]
+
+
+def get_preprocessor():
+    """
+    Returns the preprocessor all BPE/UNI vocabularisers train with
+    """
     marker = BoundaryMarker("_", detached=False, location=BoundaryMarkerLocation.START)
-    preprocessor = CuePrefab2(marker=marker)
+    return CuePrefab2(marker=marker)
+
+
+def get_training_key(algo, vocab_size, training_data_path, sweep=()):
+    """
+    Returns the artifact store key of a training job
+    """
+    key = get_artifact_key(algo, vocab_size, get_preprocessor(), training_data_path)
+    if sweep:
+        key += "_sweep" + "-".join(str(size) for size in sweep)
+    return key
+
+
+def get_vocabulariser(algo, language, vocab_size, training_data_path, sweep=(), base_artifacts=None):
+    """
+    Builds the (untrained) vocabulariser of an algorithm. The training corpus is part of the vocabulariser's
+    identity, so vocabularisers that share a language tag but not a corpus never share a tktkt cache entry
+    :param algo: algorithm name
+    :param language: language tag of the vocabulariser
+    :param vocab_size: vocabulary size
+    :param training_data_path: training corpus path
+    :param sweep: larger sweep sizes the vocabulary is derived through (see get_sweep)
+    :param base_artifacts: artifacts the vocabulary is derived from. The x8 base vocabulariser for SAGE, or the
+    vocabulariser of the next larger sweep size
+    :return: vocabulariser
+    """
+    preprocessor = get_preprocessor()
+    corpus_fingerprint = get_corpus_fingerprint(training_data_path)
     if "SAGE" in algo:
-        base_algo = algo.split("_")[0]
-        base_artifacts, _ = train_vocabulariser(base_algo, language, vocab_size*8, training_data_path)
-        vocabulariser = xSageVocabulariser(base_artifacts, vocab_size, language, base_algo)
+        return xSageVocabulariser(base_artifacts, vocab_size, language, get_base_algo(algo), corpus_fingerprint,
+                                  sweep)
     elif "BPE" in algo:
-        vocabulariser = xBPEVocabulariser(preprocessor, vocab_size, language)
+        return xBPEVocabulariser(preprocessor, vocab_size, language, corpus_fingerprint)
     else: #KUDO
-        vocabulariser = xKudoVocabulariser(preprocessor, vocab_size, language)
+        return xKudoVocabulariser(preprocessor, vocab_size, language, corpus_fingerprint)
+
+
+def get_base_job(algo, language, vocab_size, training_data_path, sweep=()):
+    """
+    Returns the training job whose artifacts the vocabulary is derived from. A training job is a tuple of
+    (algo, language, vocab_size, training_data_path, sweep)
+    :return: the x8 base job of a SAGE job, the job of the next larger size in a sweep, or None
+    """
+    if sweep:
+        return algo, language, sweep[-1], training_data_path, sweep[:-1]
+    if "SAGE" in algo:
+        return get_base_algo(algo), language, vocab_size * 8, training_data_path, ()
+    return None
+
+
+def get_stored_base_artifacts(algo, language, vocab_size, training_data_path, sweep, artifacts):
+    """
+    Returns the artifacts a stored vocabulary was derived from, which are only needed to build its vocabulariser, so
+    a base that was never stored is not trained for it. A SAGE vocabulariser only takes its preprocessor from its
+    base, and the stored SAGE artifacts carry that same effective preprocessor, so they stand in for a missing base.
+    :param artifacts: the stored artifacts of the vocabulary
+    :return: base artifacts, or None if the vocabulary has no base
+    """
+    base_job = get_base_job(algo, language, vocab_size, training_data_path, sweep)
+    if base_job is None:
+        return None
+    base_algo, _, base_vocab_size, _, base_sweep = base_job
+    base_artifacts = artifact_store.get(get_training_key(base_algo, base_vocab_size, training_data_path, base_sweep))
+    if base_artifacts is None and "SAGE" in algo:
+        return artifacts
+    return base_artifacts
+
+
+def train_vocabulariser(algo, language, vocab_size, training_data_path, sweep=(), base_artifacts=None):
+    # Every unique artifact is only trained once, across trials and across runs. The store is checked before the
+    # base vocabulary is trained, since stored artifacts do not need it
+    key = get_training_key(algo, vocab_size, training_data_path, sweep)
+    results = artifact_store.get(key)
+
+    base_job = get_base_job(algo, language, vocab_size, training_data_path, sweep)
+    if base_artifacts is None and base_job is not None:
+        if results is None:
+            base_artifacts, _ = train_vocabulariser(*base_job)
+        else:
+            base_artifacts = get_stored_base_artifacts(algo, language, vocab_size, training_data_path, sweep, results)
+    vocabulariser = get_vocabulariser(algo, language, vocab_size, training_data_path, sweep, base_artifacts)
 
-    results = vocabulariser.vocabulariseFromHf(corpus_ds, text_field="text")
+    if results is None:
+        if sweep and "SAGE" not in algo:
+            results = TruncatedBPEArtifacts(base_artifacts, vocab_size)
+        else:
+            corpus_ds = get_cached_corpus(training_data_path)
+            results = vocabulariser.vocabulariseFromHf(corpus_ds, text_field="text")
+        artifact_store.put(key, results)
     return results, vocabulariser
 
 
@@ -1,21 +1,72 @@
-from .train_vocabularisers import train_vocabulariser
-from ..tokenizers.tokenizers import get_tokenizers
-from ..utils.training_data_utils import get_ff_by_path, get_crosslingual_homographs
+import hashlib
+from .train_vocabularisers import train_vocabulariser, get_training_key
+from .scheduler import run_training_jobs, load_trained_job
+from .sweep import get_sweep
+from ..tokenizers.tokenizers import get_tokenizers, build_tokenizer
+from ..utils.training_data_utils import get_ff_by_path, get_crosslingual_homographs, get_corpus_fingerprint
 from src.utils.results_controller import get_results_directory
 from pathlib import Path
 
 
+class LanguageData:
+    """
+    The false friends and homographs of a language. They are loaded on first use and shared by all the trials of
+    the language, so they are frozen.
+    """
+    __slots__ = ("l2", "ff_data_path", "ff", "homographs", "homographs_hash")
+
+    def __init__(self, l2, ff_data_path):
+        self.l2 = l2
+        self.ff_data_path = ff_data_path
+        self.ff = None
+        self.homographs = None
+        self.homographs_hash = None
+
+    def __reduce__(self):
+        # Unpickles to the shared instance of the receiving process
+        return get_language_data, (self.l2, self.ff_data_path)
+
+    def get_ff(self):
+        if self.ff is None:
+            self.ff = frozenset(row["False Friend"] for row in get_ff_by_path(self.ff_data_path))
+        return self.ff
+
+    def get_homographs(self):
+        if self.homographs is None:
+            self.homographs = get_crosslingual_homographs("en", self.l2)
+        return self.homographs
+
+    def get_homographs_hash(self):
+        if self.homographs_hash is None:
+            digest = hashlib.blake2b("\n".join(sorted(self.get_homographs())).encode("utf-8"), digest_size=16)
+            self.homographs_hash = digest.hexdigest()
+        return self.homographs_hash
+
+
+_language_data = {}
+
+def get_language_data(l2, ff_data_path):
+    key = (l2, str(ff_data_path))
+    if key not in _language_data:
+        _language_data[key] = LanguageData(l2, ff_data_path)
+    return _language_data[key]
+
+
 class Trial:
+    __slots__ = ("arti_vocabulariser", "training_jobs", "tokenizers", "vocab_size", "ff_data_path", "l2", "algo",
+                 "language_data", "results_directory", "graph_directory", "stats_directory", "l1_corpus",
+                 "l2_corpus", "l1_l2_corpus", "cued_corpus")
 
     def __init__(self, arti_vocabulariser, tokenizers, ff_data_path, l2, algo, vocab_size, l1_corpus, l2_corpus,
-                 l1_l2_corpus, cued_corpus):
+                 l1_l2_corpus, cued_corpus, training_jobs=None):
         self.arti_vocabulariser = arti_vocabulariser
+        self.training_jobs = training_jobs
         self.tokenizers = tokenizers
         self.vocab_size = vocab_size
-        self.ff_data = get_ff_by_path(ff_data_path)
+        self.ff_data_path = ff_data_path
         self.l2 = l2
         self.algo = algo
-        self.homographs = get_crosslingual_homographs("en", l2)
+        self.language_data = get_language_data(l2, ff_data_path)
         self.results_directory = get_results_directory(self.vocab_size, self.l2, self.algo)
         self.graph_directory = Path(self.results_directory / "graphs")
         self.stats_directory = Path(self.results_directory / "stats")
@@ -24,32 +75,47 @@ class Trial:
         self.l1_l2_corpus = l1_l2_corpus
         self.cued_corpus = cued_corpus
 
+    def __getstate__(self):
+        # Only the training jobs are sent to other processes. The artifacts are loaded from the artifact store there,
+        # and the tokenizers are rebuilt from them with build_tokenizer
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state["tokenizers"] = None
+        if self.training_jobs is not None:
+            state["arti_vocabulariser"] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def get_tokenizers(self):
+        if self.tokenizers is None:
+            self.tokenizers = [build_tokenizer(self.algo, artifacts, vocabulariser)
+                               for artifacts, vocabulariser in self.get_vocabularisers()]
         return self.tokenizers
 
     def get_base_tokenizers(self):
-        return self.tokenizers[:3]
+        return self.get_tokenizers()[:3]
 
     def get_cued_tokenizer(self):
-        return self.tokenizers[3]
+        return self.get_tokenizers()[3]
 
     def get_vocabularisers(self):
+        if self.arti_vocabulariser is None:
+            self.arti_vocabulariser = [load_trained_job(job) for job in self.training_jobs]
         return self.arti_vocabulariser
 
     def get_base_vocabulariser(self):
-        return self.arti_vocabulariser[:3]
+        return self.get_vocabularisers()[:3]
 
     def get_cued_vocabulariser(self):
-        return self.arti_vocabulariser[3]
+        return self.get_vocabularisers()[3]
 
     def get_ff(self):
-        ff_words = set()
-        for i in range(len(self.ff_data)):
-            ff_words.add(self.ff_data[i]["False Friend"])
-        return ff_words
+        return self.language_data.get_ff()
 
     def get_homographs(self):
-        return self.homographs
+        return self.language_data.get_homographs()
 
     def get_algo(self):
         return self.algo
@@ -78,61 +144,125 @@ class Trial:
     def get_cued_corpus(self):
         return self.cued_corpus
 
+    def get_corpora(self):
+        return [self.l1_corpus, self.l2_corpus, self.l1_l2_corpus, self.cued_corpus]
+
+    def get_artifact_keys(self):
+        """
+        :return: the artifact store keys of the trial's vocabularisers, in the order [l1, l2, l1_l2, cues]
+        """
+        if self.training_jobs is not None:
+            return [get_training_key(algo, vocab_size, corpus, sweep)
+                    for algo, _, vocab_size, corpus, sweep in self.training_jobs]
+        return [get_training_key(self.algo, self.vocab_size, corpus) for corpus in self.get_corpora()]
+
+    def get_input_fingerprints(self):
+        """
+        Describes everything the stats of this trial are computed from, for the stage manifests
+        """
+        return {
+            "artifacts": self.get_artifact_keys(),
+            "corpora": [get_corpus_fingerprint(corpus) for corpus in self.get_corpora()],
+            "ff": get_corpus_fingerprint(self.ff_data_path),
+            "homographs": self.language_data.get_homographs_hash()
+        }
+
+
+def get_trial_jobs(algo, l2, vocab_size, l1_corpus_path, l2_corpus_path, l1_l2_corpus_path, cues_corpus_path,
+                   sweep=()):
+    """
+    Returns the training jobs of a trial, in the order [l1, l2, l1_l2, cues]
+    """
+    return [(algo, "en", vocab_size, l1_corpus_path, sweep),
+            (algo, l2, vocab_size, l2_corpus_path, sweep),
+            (algo, f"en_{l2}", vocab_size, l1_l2_corpus_path, sweep),
+            (algo, f"en_{l2}", vocab_size, cues_corpus_path, sweep)]
+
 
 def get_trial(algo, l2, vocab_size, l1_corpus_path, l2_corpus_path, l1_l2_corpus_path, cues_corpus_path):
-    l2_artifacts, l2_v = train_vocabulariser(algo, l2, vocab_size, l2_corpus_path)
-    l1_artifacts, l1_v = train_vocabulariser(algo, "en", vocab_size, l1_corpus_path)
-    l1_l2_artifacts, l1_l2_v = train_vocabulariser(algo, f"en_{l2}", vocab_size, l1_l2_corpus_path)
-    cues_artifacts, cues_v = train_vocabulariser(algo, f"en_{l2}", vocab_size, cues_corpus_path)
-    return [(l1_artifacts, l1_v), (l2_artifacts, l2_v), (l1_l2_artifacts, l1_l2_v), (cues_artifacts, cues_v)]
-
-def init_trials(data):
-    algorithms = data['algos']
-    vocab_size = data['vocab_size']
+    jobs = get_trial_jobs(algo, l2, vocab_size, l1_corpus_path, l2_corpus_path, l1_l2_corpus_path, cues_corpus_path)
+    return [train_vocabulariser(*job) for job in jobs]
+
+def get_all_trial_jobs(data, vocab_size, vocab_sizes):
+    """
+    Returns the training jobs of every trial of one vocabulary size of the sweep
+    :return: dictionary --> {lang: {algo: jobs}}
+    """
     l1_data = data['l1']
     l2_data = data['l2']
-    all_trials = {}
+    trial_jobs = {}
     for i in range(len(l2_data)):
         cur_l2_data = l2_data[i]
-        all_trials[cur_l2_data['language']] = {}
-        for algo in algorithms:
-            trial = get_trial(algo, cur_l2_data["language"], vocab_size, l1_data["training_data"],
-                              cur_l2_data["training_data"], cur_l2_data["multilingual_training_data"],
-                              cur_l2_data['training_data_cues'])
-            all_trials[cur_l2_data['language']][algo] = trial
+        trial_jobs[cur_l2_data['language']] = {}
+        for algo in data['algos']:
+            trial_jobs[cur_l2_data['language']][algo] = get_trial_jobs(
+                algo, cur_l2_data["language"], vocab_size, l1_data["training_data"], cur_l2_data["training_data"],
+                cur_l2_data["multilingual_training_data"], cur_l2_data['training_data_cues'],
+                get_sweep(algo, vocab_size, vocab_sizes))
+    return trial_jobs
 
-    return all_trials
+def get_vocab_sizes(data):
+    """
+    Returns the vocabulary sizes of the run. A config with "vocab_sizes" is a sweep over all of them
+    """
+    return data.get('vocab_sizes', [data['vocab_size']])
+
+def init_trials(data, vocab_sizes):
+    # Collect the jobs of every trial of every size first, so they can be scheduled together
+    sweep_jobs = {vocab_size: get_all_trial_jobs(data, vocab_size, vocab_sizes) for vocab_size in vocab_sizes}
+
+    all_jobs = [job for trial_jobs in sweep_jobs.values() for lang_jobs in trial_jobs.values()
+                for jobs in lang_jobs.values() for job in jobs]
+    trained = run_training_jobs(all_jobs, data.get('num_workers', 1))
+
+    all_trials = {}
+    for vocab_size, trial_jobs in sweep_jobs.items():
+        all_trials[vocab_size] = {}
+        for lang, lang_jobs in trial_jobs.items():
+            all_trials[vocab_size][lang] = {}
+            for algo, jobs in lang_jobs.items():
+                all_trials[vocab_size][lang][algo] = [trained[job] for job in jobs]
+
+    return all_trials, sweep_jobs
 
 def get_lang_data(data, lang):
     for d in data['l2']:
         if d['language'] == lang:
             return d
 
-def get_all_trials(data):
-    all_trials = init_trials(data)
-    all_tokenizers = get_tokenizers(all_trials)
-
-    encapsulated_trials = {}
-    for lang in all_trials.keys():
-        encapsulated_trials[lang] = {}
-        for algo in all_trials[lang].keys():
-            cur_trial = all_trials[lang][algo]
-            cur_tokenizers = all_tokenizers[lang][algo]
-            lang_data = get_lang_data(data, lang)
-            encapsulated_trials[lang][algo] = Trial(
-                cur_trial,
-                cur_tokenizers,
-                lang_data['ff'],
-                lang,
-                algo,
-                data['vocab_size'],
-                l1_corpus=data['l1']['training_data'],
-                l2_corpus=lang_data['training_data'],
-                l1_l2_corpus=lang_data['multilingual_training_data'],
-                cued_corpus=lang_data['training_data_cues']
-            )
-
-    return encapsulated_trials
+def get_all_sweep_trials(data, vocab_sizes):
+    """
+    Trains the trials of every vocabulary size in one schedule
+    :return: dictionary --> {vocab_size: {lang: {algo: Trial}}}
+    """
+    sweep_trials, sweep_jobs = init_trials(data, vocab_sizes)
 
+    encapsulated_sweep = {}
+    for vocab_size, all_trials in sweep_trials.items():
+        all_tokenizers = get_tokenizers(all_trials)
+        encapsulated_trials = {}
+        for lang in all_trials.keys():
+            encapsulated_trials[lang] = {}
+            for algo in all_trials[lang].keys():
+                cur_trial = all_trials[lang][algo]
+                cur_tokenizers = all_tokenizers[lang][algo]
+                lang_data = get_lang_data(data, lang)
+                encapsulated_trials[lang][algo] = Trial(
+                    cur_trial,
+                    cur_tokenizers,
+                    lang_data['ff'],
+                    lang,
+                    algo,
+                    vocab_size,
+                    l1_corpus=data['l1']['training_data'],
+                    l2_corpus=lang_data['training_data'],
+                    l1_l2_corpus=lang_data['multilingual_training_data'],
+                    cued_corpus=lang_data['training_data_cues'],
+                    training_jobs=sweep_jobs[vocab_size][lang][algo]
+                )
+        encapsulated_sweep[vocab_size] = encapsulated_trials
 
+    return encapsulated_sweep
 
+def get_all_trials(data):
+    return get_all_sweep_trials(data, [data['vocab_size']])[data['vocab_size']]
@@ -5,7 +5,7 @@ from tktkt.util.strings import shash
 
 class xBPEVocabulariser(BPEVocabulariser):
 
-    def __init__(self, preprocessor: Preprocessor, vocab_size, language):
+    def __init__(self, preprocessor: Preprocessor, vocab_size, language, corpus_fingerprint):
 
         super().__init__(
             preprocessor=preprocessor,
@@ -13,6 +13,7 @@ class xBPEVocabulariser(BPEVocabulariser):
             implementation=BpeTrainerImplementation.SENTENCEPIECE,
             character_coverage=0.9995)
         self.language = language
+        self.corpus_fingerprint = corpus_fingerprint
 
     def _identifierPartial(self) -> str:
-        return shash(repr(self.preprocessor)) + "_" + shash(f"V={self._size}_l={self._max_token_length}_c={self._character_coverage}_lang={self.language}")
\ No newline at end of file
+        return shash(repr(self.preprocessor)) + "_" + shash(f"V={self._size}_l={self._max_token_length}_c={self._character_coverage}_lang={self.language}_corpus={self.corpus_fingerprint}")
\ No newline at end of file
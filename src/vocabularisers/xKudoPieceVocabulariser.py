@@ -8,11 +8,12 @@ class xKudoVocabulariser(KudoPieceVocabulariser):
     A simplified SentencePiece (KudoPiece) Vocabulariser.
     """
 
-    def __init__(self, preprocessor: Preprocessor, vocab_size, language):
+    def __init__(self, preprocessor: Preprocessor, vocab_size, language, corpus_fingerprint):
 
 
         super().__init__(preprocessor=preprocessor, final_vocab_size=vocab_size, arguments=KudoPieceArguments())
         self.language = language
+        self.corpus_fingerprint = corpus_fingerprint
 
     def _identifierPartial(self) -> str:
-        return shash(repr(self.preprocessor)) + "_" + shash(f"V={self._size}_{repr(self._arguments)}_lang={self.language}")
\ No newline at end of file
+        return shash(repr(self.preprocessor)) + "_" + shash(f"V={self._size}_{repr(self._arguments)}_lang={self.language}_corpus={self.corpus_fingerprint}")
\ No newline at end of file
@@ -4,15 +4,23 @@ from tktkt.util.strings import shash
 
 
 class xSageVocabulariser(SageVocabulariser):
-    def __init__(self, initial_artifacts, target_vocab_size, language, initial_vocab_builder):
-        self.vocab_schedule = DoubleLinearSchedule(start=target_vocab_size*8,
-                                                   mid=target_vocab_size*2,
+    def __init__(self, initial_artifacts, target_vocab_size, language, initial_vocab_builder, corpus_fingerprint,
+                 sweep=()):
+        # By default pruning starts from a x8 base vocabulary. In a vocabulary-size sweep it continues from the
+        # SAGE vocabulary of the next larger size, with the same schedule shape (mid = end + (start - end) / 7).
+        # Chained pruning differs from pruning the x8 base directly, so the sweep is part of the identifier
+        self.sweep = tuple(sweep)
+        start = target_vocab_size*8 if not self.sweep else self.sweep[-1]
+        self.vocab_schedule = DoubleLinearSchedule(start=start,
+                                                   mid=target_vocab_size + (start - target_vocab_size)//7,
                                                    end=target_vocab_size,
                                                    t_mid=0.5)
         self.language = language
         self.initial_vocab_builder = initial_vocab_builder
+        self.corpus_fingerprint = corpus_fingerprint
         super().__init__(initial_artifacts, vocabulary_schedule=self.vocab_schedule)
 
     def _identifierPartial(self) -> str:
+        sweep = f"_sweep={'-'.join(map(str, self.sweep))}" if self.sweep else ""
         return (shash(repr(self.preprocessor)) + "_" + shash(repr(self.vocabulary_points) + repr(self.recompute_embeddings_at))
-                + "_" + shash(f"lang={self.language}_{self.initial_vocab_builder}"))
\ No newline at end of file
+                + "_" + shash(f"lang={self.language}_{self.initial_vocab_builder}_corpus={self.corpus_fingerprint}{sweep}"))
\ No newline at end of file
@@ -0,0 +1,37 @@
+import numpy as np
+from src.stats.bootstrap_stats import bootstrap_emd, count_label_pairs
+from src.stats.compare_stats import earth_movers_dist, earth_movers_dist_batch
+
+CATEGORIES = ["en_t==multi_t", "nl_t==multi_t", "en_t==nl_t", "same_splits", "different_splits"]
+
+
+def test_batch_equals_single_emd():
+    rng = np.random.default_rng(0)
+    sources, targets = rng.integers(1, 50, size=(20, 5)), rng.integers(1, 50, size=(20, 5))
+    emds, _ = earth_movers_dist_batch(CATEGORIES, "en", "nl", sources, targets, batch_size=8)
+    expected = [earth_movers_dist(CATEGORIES, "en", "nl", dict(zip(CATEGORIES, s)), dict(zip(CATEGORIES, t)))
+                for s, t in zip(sources, targets)]
+    assert np.allclose(emds, expected)
+
+
+def test_count_label_pairs():
+    counts = count_label_pairs(np.array([0, 0, 1, 2]), np.array([0, 1, 1, 0]), 3)
+    assert counts.tolist() == [[1, 1, 0], [0, 1, 0], [1, 0, 0]]
+
+
+def test_bootstrap_emd():
+    rng = np.random.default_rng(1)
+    base_labels = rng.integers(0, 5, size=2000)
+    sage_labels = np.where(rng.random(2000) < 0.3, 3, base_labels)
+    observed = earth_movers_dist(CATEGORIES, "en", "nl", dict(zip(CATEGORIES, np.bincount(base_labels))),
+                                 dict(zip(CATEGORIES, np.bincount(sage_labels))))
+
+    bootstrap, permutation = bootstrap_emd(base_labels, sage_labels, CATEGORIES, "en", "nl", 300, chunk_size=64)
+    assert len(bootstrap) == len(permutation) == 300
+    assert np.quantile(bootstrap, 0.025) <= observed <= np.quantile(bootstrap, 0.975)
+    # The sage labels move a lot of words, which the permutations almost never do
+    assert np.mean(permutation >= observed) < 0.01
+
+    # Identical trials have an EMD of 0 in every sample
+    bootstrap, permutation = bootstrap_emd(base_labels, base_labels, CATEGORIES, "en", "nl", 10)
+    assert np.allclose(bootstrap, 0) and np.allclose(permutation, 0)
@@ -0,0 +1,44 @@
+import gc
+from src.tokenizers.segmentation_cache import SegmentationCache
+
+
+class CountingTokenizer:
+    def __init__(self):
+        self.calls = 0
+
+    def prepareAndTokenise(self, word):
+        self.calls += 1
+        return list(word)
+
+
+def test_tokenizers_of_same_artifacts_share_segmentations():
+    cache = SegmentationCache()
+    artifacts = object()
+    a, b = CountingTokenizer(), CountingTokenizer()
+    cache.register(a, artifacts)
+    cache.register(b, artifacts)
+    assert cache.tokenise_many(a, ["cat", "hat", "cat"]) == [["c", "a", "t"], ["h", "a", "t"], ["c", "a", "t"]]
+    assert cache.tokenise(b, "hat") == ["h", "a", "t"]
+    assert a.calls == 2 and b.calls == 0
+
+
+def test_cache_does_not_keep_tokenizers_alive():
+    cache = SegmentationCache()
+    tokenizer = CountingTokenizer()
+    cache.register(tokenizer, object())
+    cache.tokenise(tokenizer, "cat")
+    del tokenizer
+    gc.collect()
+    assert len(cache.owners) == 0
+
+
+def test_cache_is_bounded():
+    cache = SegmentationCache(max_tokenizers=2)
+    tokenizers = [CountingTokenizer() for _ in range(3)]
+    for tokenizer in tokenizers:
+        cache.register(tokenizer, object())
+        cache.tokenise(tokenizer, "cat")
+    assert len(cache.segmentations) == 2
+    # The least recently used tokenizer segments again
+    cache.tokenise(tokenizers[0], "cat")
+    assert tokenizers[0].calls == 2
@@ -0,0 +1,64 @@
+from collections import Counter
+import pytest
+from tktkt.interfaces.identifiers import Vocab
+from tktkt.paths import setTkTkToutputRoot
+from src.stats.basic_stats import run_stats_pipeline
+from src.stats.sharded_stats import run_sharded_stats_pipeline, run_weighted_stats_pipeline
+from src.tokenizers.tokenizers import build_tokenizer
+from src.vocabularisers.train_vocabularisers import get_preprocessor
+
+WORDS = ["the", "cat", "sat", "on", "the", "mat", "", "héllo", "that", "cat", "the", "hat", "", "a"]
+MERGES = [("_", "t"), ("_t", "h"), ("a", "t"), ("_th", "e"), ("_", "c")]
+
+
+class SmallBPEArtifacts:
+    """
+    Hand-made BPE artifacts, picklable so the worker processes can build the tokenizer from them
+    """
+    def getVocabulary(self):
+        chars = sorted(set("_" + "".join(WORDS)))
+        return Vocab(ordered_types=chars + ["".join(merge) for merge in MERGES], specials=[], unk_id=None)
+
+    def getMerges(self):
+        return MERGES
+
+
+class SmallBPEVocabulariser:
+    def __init__(self):
+        self.preprocessor = get_preprocessor()
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    return build_tokenizer("BPE", SmallBPEArtifacts(), SmallBPEVocabulariser())
+
+
+@pytest.fixture(scope="module")
+def expected(tokenizer, tmp_path_factory):
+    # The tktkt pipeline caches its results under its output root, which must not be the repo
+    setTkTkToutputRoot(tmp_path_factory.mktemp("tktkt"))
+    return run_stats_pipeline(tokenizer, WORDS, "test")
+
+
+def assert_same_stats(result, expected):
+    fertility, entropy = result
+    expected_fertility, expected_entropy = expected
+    assert fertility.tokens_per_word_token == pytest.approx(expected_fertility.tokens_per_word_token)
+    assert fertility.chars_per_word_token_token_micro == \
+        pytest.approx(expected_fertility.chars_per_word_token_token_micro)
+    assert entropy.alpha == expected_entropy.alpha
+    assert entropy.entropy == pytest.approx(expected_entropy.entropy)
+
+
+@pytest.mark.parametrize("num_workers", [1, 2])
+def test_sharded_stats_equal_pipeline(expected, num_workers):
+    result = run_sharded_stats_pipeline("BPE", SmallBPEArtifacts(), SmallBPEVocabulariser(), iter(WORDS),
+                                        num_workers, shard_size=4)
+    assert_same_stats(result, expected)
+
+
+@pytest.mark.parametrize("num_workers", [1, 2])
+def test_weighted_stats_equal_pipeline(tokenizer, expected, num_workers):
+    result = run_weighted_stats_pipeline(tokenizer, "BPE", SmallBPEArtifacts(), SmallBPEVocabulariser(),
+                                         Counter(WORDS), num_workers, shard_size=3)
+    assert_same_stats(result, expected)
@@ -0,0 +1,51 @@
+import pytest
+from tktkt.interfaces.identifiers import Vocab
+from src.vocabularisers.sweep import TruncatedBPEArtifacts, get_sweep
+
+ATOMS = ["_", "a", "c", "e", "h", "t"]
+
+
+class BPEArtifacts:
+    def __init__(self, types, merges):
+        self.types = types
+        self.merges = merges
+
+    def getVocabulary(self):
+        return Vocab(ordered_types=self.types, specials=[], unk_id=None)
+
+    def getMerges(self):
+        return self.merges
+
+
+def test_truncated_bpe_keeps_merge_prefix():
+    merges = [("_", "t"), ("_t", "h"), ("a", "t"), ("_th", "e")]
+    artifacts = BPEArtifacts(ATOMS + ["_t", "_th", "at", "_the"], merges)
+    truncated = TruncatedBPEArtifacts(artifacts, len(ATOMS) + 2)
+    assert truncated.getMerges() == merges[:2]
+    assert set(truncated.getVocabulary()) == set(ATOMS + ["_t", "_th"])
+
+
+def test_truncated_bpe_accepts_string_merges():
+    artifacts = BPEArtifacts(ATOMS + ["_t", "_th"], ["_ t", "_t h"])
+    assert set(TruncatedBPEArtifacts(artifacts, len(ATOMS) + 1).getVocabulary()) == set(ATOMS + ["_t"])
+
+
+def test_truncated_bpe_rejects_merge_of_dropped_type():
+    # The second merge uses "at", which is only made by the third merge
+    artifacts = BPEArtifacts(ATOMS + ["_t", "_at", "at"], [("_", "t"), ("_", "at"), ("a", "t")])
+    with pytest.raises(ValueError):
+        TruncatedBPEArtifacts(artifacts, len(ATOMS) + 2)
+
+
+def test_truncated_bpe_rejects_merge_outside_vocabulary():
+    artifacts = BPEArtifacts(ATOMS + ["_t", "_th"], [("_", "t"), ("a", "t"), ("_t", "h")])
+    with pytest.raises(ValueError):
+        TruncatedBPEArtifacts(artifacts, len(ATOMS) + 2)
+
+
+def test_get_sweep():
+    sizes = [1000, 2000, 4000]
+    assert get_sweep("UNI_SAGE", 1000, sizes) == (4000, 2000)
+    assert get_sweep("BPE", 1000, sizes) == (4000,)
+    assert get_sweep("UNI", 1000, sizes) == ()
+    assert get_sweep("BPE_SAGE", 4000, sizes) == ()
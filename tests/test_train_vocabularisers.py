@@ -0,0 +1,39 @@
+import pytest
+from tktkt.models.sage.vocabularisation import CacheableSageArtifacts
+from src.vocabularisers.artifact_store import artifact_store
+from src.vocabularisers.scheduler import load_trained_job
+from src.vocabularisers.train_vocabularisers import get_preprocessor, get_training_key, train_vocabulariser
+from src.vocabularisers.xSageVocabulariser import xSageVocabulariser
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifact_store, "directory", tmp_path / "artifact_store")
+    monkeypatch.setattr(artifact_store, "artifacts", {})
+    path = tmp_path / "corpus.txt"
+    path.write_text("the cat sat on the mat\n", encoding="utf-8")
+    return str(path)
+
+
+def store_sage_artifacts(algo, vocab_size, corpus, sweep=()):
+    artifacts = CacheableSageArtifacts(types=["_", "a", "c", "t", "_the"])
+    artifacts.setPreprocessors(get_preprocessor())
+    artifact_store.put(get_training_key(algo, vocab_size, corpus, sweep), artifacts)
+    return artifacts
+
+
+@pytest.mark.parametrize("sweep", [(), (4000,)])
+def test_stored_sage_without_base(corpus, sweep):
+    stored = store_sage_artifacts("BPE_SAGE", 1000, corpus, sweep)
+    job = ("BPE_SAGE", "en", 1000, corpus, sweep)
+
+    artifacts, vocabulariser = load_trained_job(job)
+    assert artifacts is stored
+    assert isinstance(vocabulariser, xSageVocabulariser)
+
+    # A store hit neither trains the missing base nor trains again
+    artifacts, trained_vocabulariser = train_vocabulariser(*job)
+    assert artifacts is stored
+    assert trained_vocabulariser._identifierPartial() == vocabulariser._identifierPartial()
+    assert list(artifact_store.directory.iterdir()) == [artifact_store._get_path(get_training_key(
+        "BPE_SAGE", 1000, corpus, sweep))]